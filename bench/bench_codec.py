@@ -0,0 +1,52 @@
+import os
+import sys
+import timeit
+import hashlib
+
+#比較 json 與 bin1 兩種 wire codec：每種常見大廳訊息的 bytes 數與編碼 / 解碼時間
+#python bench/bench_codec.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import CODECS
+
+def game_info(i):
+    sha256 = hashlib.sha256(str(i).encode()).hexdigest()
+    return {'path': f'games_repo/blobs/{sha256}.py', 'desc': f'雙人對戰的井字遊戲，先連成一線的人獲勝 ({i})',
+            'user_id': 1000 + i % 7, 'player_count': 2 + i % 2, 'ver': 1 + i % 3, 'sha256': sha256}
+
+def review(i):
+    return {'username': f'player{i}', 'version': '1', 'rating': 1 + i % 5, 'comment': '很好玩，推薦給朋友！'}
+
+MESSAGES = {
+    'login request': {'collection': 'User', 'action': 'create_or_login',
+                      'data': {'username': 'player42', 'password': 'secret', 'user_type': 0}, 'req_id': 1},
+    'login response': {'ok': True, 'data': {'user': {'id': 42, 'name': 'player42', 'password': 'secret',
+                                                     'user_type': 0, 'is_connected': 1}, 'created': False}, 'req_id': 1},
+    'get_reviews request': {'cmd': 'get_reviews', 'game_name': 'tictactoe', 'req_id': 7},
+    'get_reviews (20)': {'status': 'ok', 'reviews': [review(i) for i in range(20)], 'req_id': 7},
+    'DB op request': {'op': 'check_play_eligibility', 'username': 'player42', 'game_name': 'tictactoe', 'req_id': 9},
+    'list_rooms (5)': {'status': 'ok', 'rooms': {str(i): {'game_name': f'game{i}', 'player_count': 1, 'required_count': 2,
+                                                          'display': f'game{i} (1/2)'} for i in range(5)}, 'req_id': 3},
+    'list_all_games (50)': {'status': 'ok', 'version': 12, 'games': {f'game{i}': game_info(i) for i in range(50)}},
+    'game_start push': {'status': 'game_start', 'port': 40123, 'role': 'P1', 'game': 'tictactoe', 'ver': 2,
+                        'sha256': hashlib.sha256(b'tictactoe').hexdigest(), 'push': 'game_start'},
+}
+
+def per_call_us(func, arg):
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+def main():
+    json_codec, bin_codec = CODECS['json'], CODECS['bin1']
+    print(f"{'message':22s} {'json B':>7s} {'bin1 B':>7s}   {'json enc/dec us':>16s}   {'bin1 enc/dec us':>16s}")
+    for label, msg in MESSAGES.items():
+        cols = []
+        for codec in (json_codec, bin_codec):
+            frame = codec.encode(msg)
+            assert codec.decode(frame) == msg, label
+            cols.append((len(frame), per_call_us(codec.encode, msg), per_call_us(codec.decode, frame)))
+        (jb, je, jd), (bb, be, bd) = cols
+        print(f"{label:22s} {jb:7d} {bb:7d}   {je:7.1f} / {jd:6.1f}   {be:7.1f} / {bd:6.1f}")
+
+if __name__ == "__main__":
+    main()
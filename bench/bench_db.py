@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+#DB.py 的 db_request 每秒可處理幾個 get_user_by_name / get_game_reviews
+#python bench/bench_db.py
+#「每次重新連線」模擬改版前 (每個請求開一條新的 sqlite3 連線，用完就關)，「沿用連線」是目前的做法
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+import DB
+
+USERS = 10000
+REVIEWS = 10000
+GAMES = 200
+REQUESTS = 20000
+
+def seed():
+    DB.init_db()
+    with sqlite3.connect(DB.DB_PATH) as conn:
+        conn.executemany("INSERT INTO User(name, password) VALUES(?, ?)", [(f"user{i}", "pw") for i in range(USERS)])
+        conn.executemany("INSERT INTO Review(game_name, username, version, rating, comment) VALUES(?, ?, ?, ?, ?)",
+                         [(f"game{i % GAMES}", f"user{i}", "1", 1 + i % 5, "nice game " * 5) for i in range(REVIEWS)])
+
+def reconnect_request(req):
+    """改版前的做法：每個請求開一條新連線，處理完就關閉"""
+    conn = sqlite3.connect(DB.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    reuse = DB.get_conn
+    DB.get_conn = lambda readonly=False: conn
+    try:
+        return DB.db_request(req)
+    finally:
+        DB.get_conn = reuse
+        conn.close()
+
+def ops_per_second(db_request, requests):
+    for req in requests[:500]: db_request(req) # 暖身
+    start = time.perf_counter()
+    for req in requests:
+        if not db_request(req)["ok"]: raise RuntimeError(f"request failed: {req}")
+    return len(requests) / (time.perf_counter() - start)
+
+def main():
+    workloads = {
+        'get_user_by_name': [{"op": "get_user_by_name", "name": f"user{i % USERS}"} for i in range(REQUESTS)],
+        'get_game_reviews': [{"op": "get_game_reviews", "game_name": f"game{i % GAMES}"} for i in range(REQUESTS)],
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        DB.DB_PATH = os.path.join(workdir, 'all_info.db')
+        seed()
+        print(f"{USERS} users, {REVIEWS} reviews over {GAMES} games, {REQUESTS} requests each")
+        for label, db_request in (('reconnect (before)', reconnect_request), ('reuse (after)', DB.db_request)):
+            for op, requests in workloads.items():
+                print(f"  {label:18s} {op:18s} {ops_per_second(db_request, requests):>10,.0f} ops/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+
+#比較大廳 Server 的執行緒版本與 asyncio 版本 (--asyncio)：每條閒置連線佔用的記憶體，以及指令延遲的 p50 / p99
+#python bench/bench_lobby.py [閒置連線數 (預設 2000)]
+#每種模式各在暫存資料夾裡啟動一組 server.py + DB (資料庫也在暫存資料夾)，測完就關閉
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from common import send_hello, send_json, recv_json, call
+
+CLIENT_THREADS = 20  # 同時送指令的 client 數
+CALLS = 200          # 每個 client 送幾次 list_rooms
+
+def raise_fd_limit():
+    """每條連線在兩端各佔一個 fd；子行程會繼承這裡的上限"""
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def proc_status(pid, key):
+    for line in open(f'/proc/{pid}/status'):
+        if line.startswith(key): return int(line.split()[1])
+
+def wait_for(path, text, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if text in line: return line
+        time.sleep(0.1)
+    raise RuntimeError(f"timed out waiting for '{text}' in {path}")
+
+def start_lobby(workdir, asyncio_mode):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    log = os.path.join(workdir, 'server.log')
+    args = [sys.executable, '-u', os.path.join(ROOT, 'server', 'server.py')] + (['--asyncio'] if asyncio_mode else [])
+    lobby = subprocess.Popen(args, cwd=workdir, env=env, stdout=open(log, 'w'), stderr=subprocess.STDOUT)
+    addr = wait_for(log, 'Running on').rsplit(' ', 1)[1].strip()
+    host, port = addr.rsplit(':', 1)
+    db = subprocess.Popen([sys.executable, '-u', '-c', 'import sys, DB; DB.main(sys.argv[1], int(sys.argv[2]))', host, port],
+                          cwd=workdir, env=dict(env, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'server')])),
+                          stdout=open(os.path.join(workdir, 'db.log'), 'w'), stderr=subprocess.STDOUT)
+    wait_for(log, 'DB connection established')
+    return lobby, db, (host, int(port))
+
+def login(addr, name):
+    s = socket.create_connection(addr)
+    send_hello(s, 'hi')
+    send_json(s, {'collection': 'User', 'action': 'create_or_login',
+                  'data': {'username': name, 'password': 'pw', 'user_type': 0}})
+    reply = recv_json(s)
+    if not reply or not reply.get('ok'): raise RuntimeError(f"login failed: {reply}")
+    return s
+
+def run(asyncio_mode, idle_count):
+    label = 'asyncio' if asyncio_mode else 'threaded'
+    with tempfile.TemporaryDirectory() as workdir:
+        lobby, db, addr = start_lobby(workdir, asyncio_mode)
+        try:
+            time.sleep(0.5)
+            rss0 = proc_status(lobby.pid, 'VmRSS')
+            idle = [login(addr, f'idle{i}') for i in range(idle_count)]
+            time.sleep(2)
+            rss1 = proc_status(lobby.pid, 'VmRSS')
+            threads = proc_status(lobby.pid, 'Threads')
+
+            latencies = []
+            lock = threading.Lock()
+            def worker(i):
+                s = login(addr, f'active{i}')
+                mine = []
+                for _ in range(CALLS):
+                    t = time.perf_counter()
+                    call(s, {'cmd': 'list_rooms'})
+                    mine.append(time.perf_counter() - t)
+                with lock: latencies.extend(mine)
+                s.close()
+            workers = [threading.Thread(target=worker, args=(i,)) for i in range(CLIENT_THREADS)]
+            for t in workers: t.start()
+            for t in workers: t.join()
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(f"{label:8s}: {idle_count} idle conns +{(rss1 - rss0) / 1024:.0f} MB "
+                  f"({(rss1 - rss0) / idle_count:.1f} KB/conn), {threads} threads, "
+                  f"list_rooms p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+            for s in idle: s.close()
+        finally:
+            for proc in (db, lobby):
+                proc.kill()
+                proc.wait()
+
+def main():
+    idle_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    raise_fd_limit()
+    run(False, idle_count)
+    run(True, idle_count)
+
+if __name__ == "__main__":
+    main()
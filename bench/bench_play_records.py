@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+
+#遊玩紀錄一百萬筆時 check_play_eligibility 的延遲：舊版 PlayRecord (每玩一次一列、沒有索引)
+#與 init_db 轉換後的計數表 (每個 (玩家, 遊戲) 一列，以主鍵查詢)，並量測轉換本身的時間
+#python bench/bench_play_records.py [筆數 (預設 1000000)]
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+import DB
+
+USERS = 20000
+GAMES = 500
+
+def seed_old_layout(path, rows):
+    """建立改版前的 PlayRecord，隨機塞入 rows 筆紀錄"""
+    rng = random.Random(0)
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+        CREATE TABLE PlayRecord (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            game_name TEXT NOT NULL,
+            play_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        conn.executemany("INSERT INTO PlayRecord (username, game_name) VALUES (?, ?)",
+                         ((f"user{rng.randrange(USERS)}", f"game{rng.randrange(GAMES)}") for _ in range(rows)))
+
+def report(label, check, n):
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(n):
+        username, game_name = f"user{rng.randrange(USERS)}", f"game{rng.randrange(GAMES)}"
+        start = time.perf_counter()
+        check(username, game_name)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"  {label:30s} p50 {latencies[n // 2] * 1e6:9.0f} us   p99 {latencies[int(n * 0.99)] * 1e6:9.0f} us")
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as workdir:
+        DB.DB_PATH = os.path.join(workdir, 'all_info.db')
+        start = time.perf_counter()
+        seed_old_layout(DB.DB_PATH, rows)
+        print(f"seeded {rows:,} play records ({USERS} users x {GAMES} games) in {time.perf_counter() - start:.1f} s")
+
+        old = sqlite3.connect(DB.DB_PATH)
+        def old_check(username, game_name):
+            # 改版前 check_play_eligibility 的查詢 (全表掃描)
+            return old.execute("SELECT 1 FROM PlayRecord WHERE username = ? AND game_name = ?",
+                               (username, game_name)).fetchone() is not None
+        report("before (one row per play)", old_check, 200)
+        old.close()
+
+        start = time.perf_counter()
+        DB.init_db() # 偵測到舊格式，轉換成計數表
+        migrate = time.perf_counter() - start
+        with sqlite3.connect(DB.DB_PATH) as conn:
+            counters, plays = conn.execute("SELECT COUNT(*), SUM(play_count) FROM PlayRecord").fetchone()
+        print(f"  migration {migrate:.1f} s: {plays:,} plays -> {counters:,} counter rows")
+
+        def new_check(username, game_name):
+            return DB.db_request({"op": "check_play_eligibility", "username": username, "game_name": game_name})
+        report("after (primary-key lookup)", new_check, 5000)
+
+if __name__ == "__main__":
+    main()
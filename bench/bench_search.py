@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import random
+import resource
+
+#search.py 的 SearchIndex：建立十萬款遊戲 (中英文名稱與簡介) 的索引，量測各種查詢的延遲，
+#並抽樣與逐一比對的結果核對
+#python bench/bench_search.py [遊戲數 (預設 100000)]
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+from search import SearchIndex, normalize
+
+ZH_WORDS = ["射擊", "冒險", "益智", "雙人", "對戰", "策略", "卡牌", "角色", "扮演", "休閒", "經典", "井字", "棋盤", "賽車", "解謎",
+            "合作", "回合", "即時", "像素", "音樂", "格鬥", "養成", "模擬", "經營", "塔防", "動作", "恐怖", "科幻", "魔法", "戰爭"]
+EN_WORDS = ["Tic", "Tac", "Toe", "Card", "Star", "Quest", "Dragon", "Ninja", "Pixel", "Space", "Chess", "Poker", "Snake", "Tank",
+            "Hero", "Maze"]
+QUERIES_PER_KIND = 200
+PAGE = 20
+
+def make_games(n, rng):
+    games = {}
+    for i in range(n):
+        if rng.random() < 0.6: name = f"{rng.choice(EN_WORDS)}{rng.choice(EN_WORDS)}{i}"
+        else: name = f"{rng.choice(ZH_WORDS)}{rng.choice(ZH_WORDS)}{i}"
+        desc = "".join(rng.choice(ZH_WORDS) for _ in range(rng.randint(5, 12)))
+        if rng.random() < 0.5: desc += f"，支援 {rng.randint(2, 4)} 人"
+        games[name] = desc
+    return games
+
+def brute_force(games, query):
+    terms = normalize(query).split()
+    return sorted(name for name, desc in games.items() if all(t in normalize(name) + "\n" + normalize(desc) for t in terms))
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(5)
+    games = make_games(n, rng)
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.add_many(games.items())
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"build {n:,} games: {time.perf_counter() - start:.1f} s, +{(rss1 - rss0) / 1024:.0f} MB RSS")
+
+    names = list(games)
+    kinds = {
+        "exact game name": lambda: rng.choice(names),
+        "digits of a game id": lambda: str(rng.randrange(n // 10, n)),
+        "2-char CJK word": lambda: rng.choice(ZH_WORDS),
+        "English word pair": lambda: rng.choice(EN_WORDS) + rng.choice(EN_WORDS),
+        "4-char CJK + 2nd term": lambda: f"{rng.choice(ZH_WORDS)}{rng.choice(ZH_WORDS)} {rng.choice(ZH_WORDS)}",
+        "single CJK character": lambda: rng.choice("".join(ZH_WORDS)),
+    }
+    for label, make_query in kinds.items():
+        queries = [make_query() for _ in range(QUERIES_PER_KIND)]
+        for query in queries[:3]:
+            expected = brute_force(games, query)
+            total, page = index.search(query, 0, PAGE)
+            if total != len(expected) or page != expected[:PAGE]: raise AssertionError(f"mismatch for {query!r}")
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            total, _ = index.search(query, 0, PAGE)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"  {label:24s} p50 {latencies[len(latencies) // 2] * 1e3:7.3f} ms   "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:7.3f} ms   (last query matched {total:,})")
+
+    start = time.perf_counter()
+    for i in range(1000): index.add(f"new{i}", "新增的遊戲簡介 射擊")
+    print(f"  incremental add          {(time.perf_counter() - start) / 1000 * 1e6:7.0f} us/game")
+
+if __name__ == "__main__":
+    main()
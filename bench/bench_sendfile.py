@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import socket
+import struct
+import tempfile
+import threading
+
+#common.send_file (sendfile，小檔案與 header 一起送) 與改版前的 read(4096) + sendall 迴圈：
+#1 KB / 1 MB / 500 MB 檔案經 loopback TCP 傳送的吞吐量，以及送出端每 MB 花的 CPU 時間
+#python bench/bench_sendfile.py
+#接收端固定用 recv_into 丟掉資料，兩種做法的差別只在送出端
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import send_file
+
+SIZES = [  # (名稱, bytes, 傳送次數)
+    ('1 KB', 1024, 20000),
+    ('1 MB', 1024 * 1024, 500),
+    ('500 MB', 500 * 1024 * 1024, 2),
+]
+
+def send_file_before(sock, filepath):
+    """改版前的 send_file：header 後以 4 KB 為單位 read + sendall"""
+    sock.sendall(struct.pack('!I', os.path.getsize(filepath)))
+    with open(filepath, 'rb') as f:
+        while True:
+            bytes_read = f.read(4096)
+            if not bytes_read: break
+            sock.sendall(bytes_read)
+    return True
+
+def drain(sock, total):
+    buf = bytearray(1024 * 1024)
+    view = memoryview(buf)
+    while total > 0:
+        n = sock.recv_into(view[:min(len(buf), total)])
+        if not n: raise ConnectionError("sender closed early")
+        total -= n
+
+def connected_pair():
+    listener = socket.create_server(('127.0.0.1', 0))
+    client = socket.create_connection(listener.getsockname())
+    server, _ = listener.accept()
+    listener.close()
+    return server, client
+
+def measure(send, path, size, times):
+    """回傳 (MB/s, 送出端每 MB 的 CPU ms)"""
+    sender, receiver = connected_pair()
+    reader = threading.Thread(target=drain, args=(receiver, (size + 4) * times))
+    reader.start()
+    start, cpu = time.perf_counter(), time.thread_time() # thread_time 含 kernel 時間 (sendfile 的複製在 kernel 裡)
+    for _ in range(times):
+        if not send(sender, path): raise RuntimeError("send failed")
+    cpu = time.thread_time() - cpu
+    reader.join()
+    elapsed = time.perf_counter() - start
+    sender.close()
+    receiver.close()
+    mb = size * times / (1024 * 1024)
+    return mb / elapsed, cpu * 1000 / mb
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, size, times in SIZES:
+            path = os.path.join(workdir, 'game.py')
+            with open(path, 'wb') as f:
+                chunk = os.urandom(1024 * 1024)
+                for offset in range(0, size, len(chunk)): f.write(chunk[:size - offset])
+            for name, send in (('before (read/sendall)', send_file_before), ('after (send_file)', send_file)):
+                throughput, cpu_per_mb = measure(send, path, size, times)
+                print(f"  {label:7s} {name:22s} {throughput:9,.0f} MB/s   {cpu_per_mb:7.2f} ms CPU/MB")
+            os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,482 @@
 import json
 import struct
 import os
+import hashlib
+import zlib
+import threading
+import weakref
+import collections
 FORMAT = 'utf-8'
 MAX_LEN = 65536
+FILE_CHUNK_MIN = 64 * 1024    #recv_file 起始 chunk 大小
+FILE_CHUNK_MAX = 1024 * 1024  #recv_file chunk 上限 (也是預先配置的 buffer 大小)
+READ_BUF = 4 * 1024           #FrameReader 初始緩衝區大小 (不夠會自動放大)
+MAX_FRAME = 8 * 1024 * 1024   #recv_json 接受的 frame 上限，header 宣稱更長就斷線
+ZLIB_SUFFIX = '.zz'           #壓縮後的遊戲檔副檔名
+
+class FrameReader:
+    """
+    每個 socket 一個的讀取緩衝區。
+    一次 recv_into 盡量收滿緩衝區，同一次 syscall 收到的多個 length-prefixed frame
+    直接從緩衝區解析，不必每個訊息各 recv 兩次。
+    read_frame 回傳的 memoryview 只在下一次讀取前有效。
+    """
+    def __init__(self, sock, bufsize=READ_BUF):
+        self._sock = weakref.ref(sock) # 避免 reader 讓 socket 無法被回收
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._start = 0 # 尚未讀取資料的開頭
+        self._end = 0   # 尚未讀取資料的結尾
+
+    def _make_room(self, need):
+        """讓緩衝區從 _start 起至少能放 need bytes：先把未讀資料搬到最前面，不夠再放大"""
+        pending = self._end - self._start
+        if need > len(self._buf):
+            # 不能直接 resize (有 memoryview 指著它)，另外配置一塊新的
+            new_buf = bytearray(max(need, len(self._buf) * 2))
+            new_buf[:pending] = self._view[self._start:self._end]
+            self._buf = new_buf
+            self._view = memoryview(new_buf)
+        elif pending:
+            self._view[:pending] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def _recv_view(self, need):
+        """準備好至少 need bytes 的空間，回傳可以 recv_into 的區段"""
+        if self._start == self._end:
+            self._start = self._end = 0
+        if len(self._buf) - self._start < need:
+            self._make_room(need)
+        return self._view[self._end:]
+
+    def _step(self, need):
+        """這次 recv 要準備的空間：隨著實際收到的資料放大，不照 header 宣稱的長度一次配置"""
+        return min(need, self._end - self._start + FILE_CHUNK_MAX)
+
+    def _fill(self, need):
+        """確保緩衝區至少有 need bytes 未讀資料，連線中斷回傳 False"""
+        while self._end - self._start < need:
+            n = self._sock().recv_into(self._recv_view(self._step(need)))
+            if not n: return False
+            self._end += n
+        return True
+
+    async def _fill_async(self, need):
+        """_fill 的 asyncio 版本，sock 需提供 recv_into_async (見 server.py 的 AsyncConn)"""
+        while self._end - self._start < need:
+            n = await self._sock().recv_into_async(self._recv_view(self._step(need)))
+            if not n: return False
+            self._end += n
+        return True
+
+    def _frame_length(self, max_len):
+        length = struct.unpack_from('!I', self._buf, self._start)[0]
+        self._start += 4
+        if max_len is not None and (length <= 0 or length > max_len): return None
+        return length
+
+    def _take(self, n):
+        frame = self._view[self._start:self._start + n]
+        self._start += n
+        return frame
+
+    def read_frame(self, max_len=None):
+        """讀一個 4-byte 長度開頭的 frame，回傳內容的 memoryview；連線中斷或長度不合法回傳 None"""
+        if not self._fill(4): return None
+        length = self._frame_length(max_len)
+        if length is None or not self._fill(length): return None
+        return self._take(length)
+
+    async def read_frame_async(self, max_len=None):
+        """read_frame 的 asyncio 版本"""
+        if not await self._fill_async(4): return None
+        length = self._frame_length(max_len)
+        if length is None or not await self._fill_async(length): return None
+        return self._take(length)
+
+    def read_exact(self, n):
+        """收滿 n bytes，連線中斷回傳 None"""
+        if not self._fill(n): return None
+        return bytes(self._take(n))
+
+    def readinto(self, view):
+        """先給緩衝區裡剩下的資料，沒有的話直接 recv_into 到呼叫端的 buffer (大檔案不經過緩衝區)"""
+        pending = self._end - self._start
+        if pending:
+            n = min(pending, len(view))
+            view[:n] = self._view[self._start:self._start + n]
+            self._start += n
+            return n
+        return self._sock().recv_into(view, len(view))
+
+_readers = weakref.WeakKeyDictionary()
+_readers_lock = threading.Lock()
+
+def get_reader(sock):
+    """取得 sock 專屬的 FrameReader (同一個 socket 的所有讀取都要經過它，否則會漏掉已緩衝的資料)"""
+    with _readers_lock:
+        reader = _readers.get(sock)
+        if reader is None:
+            reader = _readers[sock] = FrameReader(sock)
+        return reader
+
+_send_locks = weakref.WeakKeyDictionary()
+
+def send_lock(sock):
+    """
+    sock 專屬的寫入鎖 (RLock)。送出都會先拿這把鎖，所以別的執行緒的推播不會插進一半的 frame；
+    要讓好幾個 frame 連續送出 (例如回覆 + 檔案) 時，呼叫端可以自己 with 住它。
+    """
+    with _readers_lock:
+        lock = _send_locks.get(sock)
+        if lock is None:
+            lock = _send_locks[sock] = threading.RLock()
+        return lock
+
+def recv_exact(sock, n):
+    """收滿 n bytes，連線中斷回傳 None (sock.recv(n) 可能只收到一部分)"""
+    return get_reader(sock).read_exact(n)
+
+# ============================================
+# 編碼 (codec)：send_json / recv_json 依 socket 協商的結果選擇
+# ============================================
+
+class JsonCodec:
+    name = 'json'
+
+    def encode(self, data):
+        return json.dumps(data).encode(FORMAT)
+
+    def decode(self, frame):
+        return json.loads(str(frame, FORMAT))
+
+    def add_field(self, payload, key, value):
+        """在已編碼的 dict 最前面插入一個欄位 (不必重新編碼整個 dict)"""
+        field = json.dumps({key: value}).encode(FORMAT)[1:-1]
+        if payload == b'{}': return b'{' + field + b'}'
+        return b'{' + field + b', ' + payload[1:]
+
+# bin1 的型別標記
+_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_FLOAT, _T_STR, _T_LIST, _T_DICT, _T_END = range(9)
+_T_INTERN = 0x80 # 0x80 | index：常用字串 (key 或固定值) 只用 1 byte
+
+# 只能往後加，不能改順序 (改了就要換一個 codec 名稱)
+BIN1_INTERNED = (
+    'cmd', 'status', 'msg', 'ok', 'fail', 'name', 'desc', 'ver', 'user_id',
+    'player_count', 'path', 'games', 'reviews', 'username', 'rating', 'comment',
+    'version', 'op', 'data', 'error', 'code', 'message', 'user', 'id', 'password',
+    'room_id', 'user_code', 'is_connected', 'created', 'collection', 'action',
+    'rooms', 'game_name', 'game', 'required_count', 'display', 'port', 'role',
+    'game_start', 'ready', 'eligible', 'upload', 'update_game', 'delete_game',
+    'list_games', 'list_all_games', 'download', 'list_rooms', 'create_room',
+    'join_room', 'get_reviews', 'submit_review', 'logout', 'get_user_by_name',
+    'create_user', 'set_user_connected', 'add_play_record',
+    'check_play_eligibility', 'get_game_reviews', 'not_found',
+)
+_BIN1_INDEX = {s: i for i, s in enumerate(BIN1_INTERNED)}
+
+class BinaryCodec:
+    """
+    純 Python 的精簡二進位編碼，資料模型跟 JSON 一樣
+    (dict 的 key 一律轉成字串，tuple 當 list)。
+    整數用 zigzag varint，字串用 varint 長度 + UTF-8，常用字串查表只佔 1 byte，
+    dict 用 _T_END 結尾 (不用先知道項目數)。
+    """
+    name = 'bin1'
+
+    def encode(self, data):
+        out = bytearray()
+        self._enc(data, out)
+        return bytes(out)
+
+    def add_field(self, payload, key, value):
+        """在已編碼的 dict 最前面插入一個欄位 (dict 用 _T_END 結尾，直接接在標記後面即可)"""
+        out = bytearray(payload[:1])
+        self._str(key, out)
+        self._enc(value, out)
+        out += memoryview(payload)[1:]
+        return bytes(out)
+
+    def decode(self, frame):
+        value, pos = self._dec(bytes(frame), 0)
+        return value
+
+    @staticmethod
+    def _varint(n, out):
+        while n > 0x7F:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def _str(self, s, out):
+        idx = _BIN1_INDEX.get(s)
+        if idx is not None:
+            out.append(_T_INTERN | idx)
+            return
+        b = s.encode(FORMAT)
+        out.append(_T_STR)
+        self._varint(len(b), out)
+        out += b
+
+    def _enc(self, v, out):
+        if isinstance(v, str):
+            self._str(v, out)
+        elif v is None:
+            out.append(_T_NONE)
+        elif v is True:
+            out.append(_T_TRUE)
+        elif v is False:
+            out.append(_T_FALSE)
+        elif isinstance(v, int):
+            out.append(_T_INT)
+            self._varint(v << 1 if v >= 0 else ((-v) << 1) - 1, out)
+        elif isinstance(v, float):
+            out.append(_T_FLOAT)
+            out += struct.pack('!d', v)
+        elif isinstance(v, dict):
+            out.append(_T_DICT)
+            for k, item in v.items():
+                if not isinstance(k, str):
+                    k = json.dumps(k) # 與 JSON 相同：1 -> "1", True -> "true", None -> "null"
+                self._str(k, out)
+                self._enc(item, out)
+            out.append(_T_END)
+        elif isinstance(v, (list, tuple)):
+            out.append(_T_LIST)
+            self._varint(len(v), out)
+            for item in v:
+                self._enc(item, out)
+        else:
+            raise TypeError(f"Object of type {type(v).__name__} is not serializable")
+
+    def _dec(self, b, pos):
+        tag = b[pos]
+        pos += 1
+        if tag & _T_INTERN:
+            return BIN1_INTERNED[tag & 0x7F], pos
+        if tag == _T_STR or tag == _T_INT or tag == _T_LIST:
+            n = shift = 0
+            while True:
+                byte = b[pos]
+                pos += 1
+                n |= (byte & 0x7F) << shift
+                if byte < 0x80: break
+                shift += 7
+            if tag == _T_STR:
+                return b[pos:pos + n].decode(FORMAT), pos + n
+            if tag == _T_INT:
+                return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+            items = []
+            for _ in range(n):
+                item, pos = self._dec(b, pos)
+                items.append(item)
+            return items, pos
+        if tag == _T_DICT:
+            d = {}
+            while b[pos] != _T_END:
+                k, pos = self._dec(b, pos)
+                d[k], pos = self._dec(b, pos)
+            return d, pos + 1
+        if tag == _T_NONE: return None, pos
+        if tag == _T_TRUE: return True, pos
+        if tag == _T_FALSE: return False, pos
+        if tag == _T_FLOAT: return struct.unpack_from('!d', b, pos)[0], pos + 8
+        raise ValueError(f"bin1: unknown tag {tag:#x} at {pos - 1}")
+
+CODECS = {c.name: c for c in (JsonCodec(), BinaryCodec())}
+DEFAULT_CODEC = CODECS['json']
+# client 握手時提出的編碼 (依偏好排序)。預設 JSON；bin1 訊息小 30~60%，但純 Python 編解碼的 CPU 約是 JSON 的 2~4 倍
+# (見 bench/bench_codec.py)，頻寬比 CPU 吃緊時再以 send_hello(sock, role, ('bin1', 'json')) 選用
+WIRE_CODECS = ('json', 'bin1')
+
+_codecs = weakref.WeakKeyDictionary()
+
+def set_codec(sock, name):
+    _codecs[sock] = CODECS[name]
+
+def get_codec(sock):
+    return _codecs.get(sock, DEFAULT_CODEC)
+
+def encode_frame(sock, data):
+    """用 sock 協商的編碼把 data 編成含長度 header 的完整 frame"""
+    payload = get_codec(sock).encode(data)
+    return struct.pack('!I', len(payload)) + payload
+
+class EncodedMessage:
+    """
+    要送給很多連線的同一則訊息 (例如商城列表)：每種編碼只編一次並保留結果，
+    送出時只插入各連線自己的欄位 (如 req_id)，不必整份重新編碼。
+    """
+    def __init__(self, data):
+        self.data = data
+        self._payloads = {} # codec 名稱 -> 編碼後的 bytes
+
+    def frame(self, sock, **fields):
+        codec = get_codec(sock)
+        payload = self._payloads.get(codec.name)
+        if payload is None:
+            payload = self._payloads[codec.name] = codec.encode(self.data)
+        for key, value in fields.items():
+            payload = codec.add_field(payload, key, value)
+        return struct.pack('!I', len(payload)) + payload
+
+def send_encoded(sock, message, **fields):
+    """送出 EncodedMessage，fields 為這次額外插入的欄位"""
+    try:
+        frame = message.frame(sock, **fields)
+        with send_lock(sock):
+            sock.sendall(frame)
+    except Exception as e:
+        print(f"[Error] Send JSON failed: {e}")
 
 def send_json(sock, data):
     try:
-        json_bytes = json.dumps(data).encode(FORMAT)
-        header = struct.pack('!I', len(json_bytes))
-        sock.sendall(header + json_bytes)
+        frame = encode_frame(sock, data)
+        with send_lock(sock):
+            sock.sendall(frame)
     except Exception as e:
         print(f"[Error] Send JSON failed: {e}")
 
 def recv_json(sock):
     try:
-        header = sock.recv(4)
-        if not header: return None
-        length = struct.unpack('!I', header)[0]
-        
-        data = b''
-        while len(data) < length:
-            packet = sock.recv(length - len(data))
-            if not packet: return None
-            data += packet
-        return json.loads(data.decode(FORMAT))
+        frame = get_reader(sock).read_frame(MAX_FRAME)
+        if frame is None: return None
+        with frame:
+            return get_codec(sock).decode(frame)
     except Exception as e:
         print(f"[Error] Recv JSON failed: {e}")
         return None
 
-def send_file(sock, filepath):
+def send_file(sock, filepath, offset=0, length=None):
+    """送出 filepath 從 offset 開始的 length bytes (預設到檔尾)，header 是這一段的長度"""
+    with send_lock(sock):
+        return _send_file(sock, filepath, offset, length)
+
+def _send_file(sock, filepath, offset, length):
     if not os.path.exists(filepath): 
         print(f"[Error] File not found: {filepath}")
         return False
     try:
+        if not os.path.isfile(filepath):
+            # 非一般檔案(如 FIFO)無法預知大小也無法 sendfile，先整個讀進記憶體
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            data = data[offset:] if length is None else data[offset:offset + length]
+            if len(data) > 0xFFFFFFFF:
+                raise ValueError(f"File size exceeds 4GB: {len(data)} bytes")
+            sock.sendall(struct.pack('!I', len(data)) + data)
+            return True
+
         filesize = os.path.getsize(filepath)
-        if filesize > 0xFFFFFFFF: #4 bytes header = 4GB
-             raise ValueError(f"File size exceeds 4GB: {filesize} bytes")
-        header = struct.pack('!I', filesize)
+        if not 0 <= offset <= filesize:
+            raise ValueError(f"Offset {offset} out of range (file size {filesize})")
+        if length is None or length > filesize - offset:
+            length = filesize - offset
+        if length > 0xFFFFFFFF: #4 bytes header = 4GB
+             raise ValueError(f"File size exceeds 4GB: {length} bytes")
+        header = struct.pack('!I', length)
+        if length <= FILE_CHUNK_MIN:
+            # 小檔案 sendfile 的額外成本比複製還高，直接跟 header 一起送
+            with open(filepath, 'rb') as f:
+                f.seek(offset)
+                sock.sendall(header + f.read(length))
+            return True
         sock.sendall(header)
         
+        # socket.sendfile 走 kernel 的 os.sendfile (zero-copy)，平台不支援時會自動退回 send()
         with open(filepath, 'rb') as f:
-            while True:
-                bytes_read = f.read(4096)
-                if not bytes_read: break
-                sock.sendall(bytes_read)
+            sent = sock.sendfile(f, offset, length)
+        if sent != length:
+            raise IOError(f"File changed while sending: sent {sent}/{length} bytes")
         return True
     except Exception as e:
         print(f"[Error] Send file failed: {e}")
         return False
 
-def recv_file(sock, savepath):
+# asyncio 版本：sock 需提供 sendall_async / recv_into_async (見 server.py 的 AsyncConn)
+
+async def send_json_async(sock, data):
+    try:
+        await sock.sendall_async(encode_frame(sock, data))
+    except Exception as e:
+        print(f"[Error] Send JSON failed: {e}")
+
+async def recv_json_async(sock):
+    try:
+        frame = await get_reader(sock).read_frame_async(MAX_FRAME)
+        if frame is None: return None
+        with frame:
+            return get_codec(sock).decode(frame)
+    except Exception as e:
+        print(f"[Error] Recv JSON failed: {e}")
+        return None
+
+async def send_text_async(sock, msg):
+    try:
+        data = msg.encode(FORMAT)
+        if len(data) <= 0 or len(data) > MAX_LEN:
+            raise ValueError("Invalid payload length in send_text")
+        await sock.sendall_async(struct.pack("!I", len(data)) + data)
+    except Exception as e:
+        print(f"[Error] Send text failed: {e}")
+
+async def recv_text_async(sock):
+    try:
+        frame = await get_reader(sock).read_frame_async(MAX_LEN)
+        if frame is None: return None
+        with frame:
+            return str(frame, FORMAT)
+    except Exception as e:
+        print(f"[Error] Recv text failed: {e}")
+        return None
+
+def file_sha256(path, hasher=None):
+    """串流計算檔案的 SHA-256 並回傳 hash 物件；傳入 hasher 時接著更新它 (續傳時先把已收到的部分算進去)"""
+    h = hasher if hasher is not None else hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(FILE_CHUNK_MAX)
+            if not chunk: break
+            h.update(chunk)
+    return h
+
+def recv_file(sock, savepath, append=False, hasher=None):
+    """
+    接收一個檔案 (或一段範圍)；append=True 時接在 savepath 現有內容後面 (續傳用)。
+    有傳 hasher (如 hashlib.sha256()) 時邊寫邊更新，收完不必再讀一次檔案就能驗證。
+    """
     try:        
         dir_path = os.path.dirname(savepath)
-        if not os.path.exists(dir_path): os.makedirs(dir_path)
+        if dir_path and not os.path.exists(dir_path): os.makedirs(dir_path)
         
-        header = sock.recv(4)
-        if not header or len(header) < 4:
+        reader = get_reader(sock)
+        header = reader.read_exact(4)
+        if header is None:
             print(f"[ERROR] Failed to receive file header for {savepath}")
             return False
         filesize = struct.unpack('!I', header)[0]
         print(f"正在接收文件 ({filesize} bytes)...")
         
+        # 預先配置一塊 buffer 重複使用，用 recv_into 直接收進去；
+        # 每次 recv 都收滿時把 chunk 加倍 (最多 FILE_CHUNK_MAX)，減少 syscall 次數
+        buf = bytearray(min(FILE_CHUNK_MAX, max(filesize, 1)))
+        view = memoryview(buf)
+        chunk_size = min(FILE_CHUNK_MIN, len(buf))
         received_len = 0
         last_progress = 0
-        with open(savepath, 'wb') as newFile:
+        with open(savepath, 'ab' if append else 'wb') as newFile:
             while received_len < filesize:
-                chunk = sock.recv(min(4096, filesize - received_len))
-                if not chunk: 
+                want = min(chunk_size, filesize - received_len)
+                n = reader.readinto(view[:want])
+                if not n: 
                     print(f"[ERROR] Connection closed while receiving file, received {received_len}/{filesize} bytes")
                     break
-                newFile.write(chunk)
-                received_len += len(chunk)
+                newFile.write(view[:n])
+                if hasher is not None: hasher.update(view[:n])
+                received_len += n
+                if n == chunk_size and chunk_size < len(buf):
+                    chunk_size = min(chunk_size * 2, len(buf))
                 
                 progress = int((received_len / filesize) * 100)
                 if progress >= last_progress + 10:
@@ -87,20 +493,114 @@ def recv_file(sock, savepath):
         print(f"[ERROR] Recv file failed: {e}")
         return False
 
+def compress_file(src, dst, level=9):
+    """串流地把 src 以 zlib 壓縮寫到 dst，回傳壓縮後大小"""
+    comp = zlib.compressobj(level)
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            chunk = fin.read(FILE_CHUNK_MAX)
+            if not chunk: break
+            fout.write(comp.compress(chunk))
+        fout.write(comp.flush())
+        return fout.tell()
+
+def decompress_file(src, dst, hasher=None):
+    """串流地把 zlib 壓縮的 src 解壓到 dst；有傳 hasher 時對解壓後的內容計算 hash"""
+    decomp = zlib.decompressobj()
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            chunk = fin.read(FILE_CHUNK_MAX)
+            if not chunk: break
+            data = decomp.decompress(chunk)
+            fout.write(data)
+            if hasher is not None: hasher.update(data)
+        data = decomp.flush()
+        fout.write(data)
+        if hasher is not None: hasher.update(data)
+    if not decomp.eof:
+        raise ValueError(f"Truncated zlib stream: {src}")
+
+#差異檔 (delta) 格式：zlib 壓縮的一連串指令
+#  b'C' + !II (舊檔位移, 長度)：從舊檔複製一段
+#  b'I' + !I (長度) + 內容：插入新內容
+#以「行」為單位比對 (文字檔的遊戲腳本改版通常只動到幾行)，二進位檔的「行」就是兩個 \n 之間的位元組
+DELTA_MAGIC = b'GDLT1'
+DELTA_COPY = struct.Struct('!cII')
+DELTA_INSERT = struct.Struct('!cI')
+
+def make_delta(old_path, new_path, dst, level=9):
+    """產生把 old_path 變成 new_path 的差異檔 dst，回傳差異檔大小"""
+    with open(old_path, 'rb') as f: old = f.read()
+    with open(new_path, 'rb') as f: new = f.read()
+    old_lines = old.splitlines(keepends=True)
+    old_offsets = [0]
+    for line in old_lines: old_offsets.append(old_offsets[-1] + len(line))
+    first = {}   # 行內容 -> 在舊檔第一次出現的行號
+    for j, line in enumerate(old_lines): first.setdefault(line, j)
+
+    ops = [DELTA_MAGIC]
+    inserted = bytearray()
+    new_lines = new.splitlines(keepends=True)
+    i, next_j = 0, len(old_lines)
+    while i < len(new_lines):
+        line = new_lines[i]
+        # 優先接著上一段複製的位置 (重複的行才不會跳來跳去)，否則找這行在舊檔第一次出現的地方
+        j = next_j if next_j < len(old_lines) and old_lines[next_j] == line else first.get(line)
+        if j is None:
+            inserted += line
+            i += 1
+            continue
+        start = j
+        while i < len(new_lines) and j < len(old_lines) and new_lines[i] == old_lines[j]:
+            i += 1
+            j += 1
+        if inserted:
+            ops.append(DELTA_INSERT.pack(b'I', len(inserted)))
+            ops.append(bytes(inserted))
+            inserted.clear()
+        ops.append(DELTA_COPY.pack(b'C', old_offsets[start], old_offsets[j] - old_offsets[start]))
+        next_j = j
+    if inserted:
+        ops.append(DELTA_INSERT.pack(b'I', len(inserted)))
+        ops.append(bytes(inserted))
+    with open(dst, 'wb') as f:
+        f.write(zlib.compress(b''.join(ops), level))
+        return f.tell()
+
+def apply_delta(old_path, delta_path, dst, hasher=None):
+    """把差異檔套用到 old_path 寫成 dst；有傳 hasher 時對結果計算 hash。差異檔格式錯誤時丟出 ValueError"""
+    with open(old_path, 'rb') as f: old = f.read()
+    with open(delta_path, 'rb') as f:
+        try:
+            data = zlib.decompress(f.read())
+        except zlib.error as e:
+            raise ValueError(f"Bad delta: {e}")
+    if not data.startswith(DELTA_MAGIC): raise ValueError("Bad delta: magic")
+    pos = len(DELTA_MAGIC)
+    with open(dst, 'wb') as fout:
+        while pos < len(data):
+            if data[pos:pos + 1] == b'C':
+                _, offset, length = DELTA_COPY.unpack_from(data, pos)
+                pos += DELTA_COPY.size
+                if offset + length > len(old): raise ValueError("Bad delta: copy out of range")
+                chunk = old[offset:offset + length]
+            elif data[pos:pos + 1] == b'I':
+                _, length = DELTA_INSERT.unpack_from(data, pos)
+                pos += DELTA_INSERT.size
+                chunk = data[pos:pos + length]
+                if len(chunk) != length: raise ValueError("Bad delta: truncated insert")
+                pos += length
+            else:
+                raise ValueError("Bad delta: unknown op")
+            fout.write(chunk)
+            if hasher is not None: hasher.update(chunk)
+
 def recv_text(sock):
     try:
-        header = sock.recv(4)
-        if not header: return None
-        length = struct.unpack("!I", header)[0]
-        if length <= 0 or length > MAX_LEN: return None
-        
-        text = b''
-        while len(text) < length:
-            chunk = sock.recv(length - len(text))
-            if not chunk: return None
-            text += chunk
-        if text is None: return None
-        return text.decode(FORMAT) 
+        frame = get_reader(sock).read_frame(MAX_LEN)
+        if frame is None: return None
+        with frame:
+            return str(frame, FORMAT)
     except Exception as e:
         print(f"[Error] Recv text failed: {e}")
         return None
@@ -112,6 +612,108 @@ def send_text(sock, msg):
         if length <= 0 or length > MAX_LEN: 
             raise ValueError("Invalid payload length in send_text")
         header = struct.pack("!I", length)
-        sock.sendall(header + data)
+        with send_lock(sock):
+            sock.sendall(header + data)
     except Exception as e:
-        print(f"[Error] Send text failed: {e}")
\ No newline at end of file
+        print(f"[Error] Send text failed: {e}")
+
+# ============================================
+# Client 端請求/回覆對應 (req_id) 與 Server 推播
+# ============================================
+
+class _Mailbox:
+    def __init__(self):
+        self.next_id = 1
+        self.replies = {}                   # req_id -> 回覆
+        self.pushes = collections.deque()   # Server 推播 (帶 push 欄位)，等 recv_push 取用
+
+_mailboxes = weakref.WeakKeyDictionary()
+
+def _mailbox(sock):
+    box = _mailboxes.get(sock)
+    if box is None:
+        box = _mailboxes[sock] = _Mailbox()
+    return box
+
+def _recv_routed(sock, box):
+    """收一則訊息並分類：推播放進 pushes，回覆依 req_id 放進 replies。連線中斷回傳 False"""
+    msg = recv_json(sock)
+    if msg is None: return False
+    if 'push' in msg:
+        box.pushes.append(msg)
+    else:
+        box.replies[msg.pop('req_id', None)] = msg
+    return True
+
+def call_many(sock, requests):
+    """
+    Pipelining：一次送出多個請求 (一次 sendall)，再依 req_id 收齊回覆。
+    回傳與 requests 同順序的回覆 list，連線中斷的項目為 None。
+    期間收到的 Server 推播會留給 recv_push。
+    """
+    box = _mailbox(sock)
+    ids = list(range(box.next_id, box.next_id + len(requests)))
+    box.next_id += len(requests)
+    frames = b''.join(encode_frame(sock, dict(r, req_id=i)) for r, i in zip(requests, ids))
+    try:
+        with send_lock(sock):
+            sock.sendall(frames)
+    except Exception as e:
+        print(f"[Error] Send requests failed: {e}")
+        return [None] * len(requests)
+    for i in ids:
+        while i not in box.replies:
+            if not _recv_routed(sock, box):
+                return [box.replies.pop(j, None) for j in ids]
+    return [box.replies.pop(i) for i in ids]
+
+def call(sock, request):
+    """送出一個請求並等它的回覆 (依 req_id 對應，不會誤收推播)"""
+    return call_many(sock, [request])[0]
+
+def recv_push(sock):
+    """取得下一則 Server 推播 (如 game_start)，連線中斷回傳 None"""
+    box = _mailbox(sock)
+    while not box.pushes:
+        if not _recv_routed(sock, box): return None
+    return box.pushes.popleft()
+
+def send_hello(sock, role, codecs=WIRE_CODECS):
+    """
+    Client 端握手：送出 "<role> <codec1,codec2,...>"，並等待 Server 選定的編碼。
+    之後這個 socket 的 send_json / recv_json 都使用該編碼。
+    """
+    send_text(sock, f"{role} {','.join(codecs)}")
+    chosen = recv_text(sock)
+    if chosen not in CODECS:
+        raise ConnectionError(f"codec negotiation failed: {chosen}")
+    set_codec(sock, chosen)
+    return chosen
+
+def recv_hello(sock):
+    """
+    Server 端握手：回傳對方的角色 (如 "hi" / "DB")，連線中斷回傳 None。
+    對方有列出編碼就選第一個支援的並回覆；只送角色的舊版 client 維持 JSON、不回覆。
+    """
+    first = recv_text(sock)
+    if first is None: return None
+    role, _, offered = first.partition(' ')
+    if offered:
+        chosen = _choose_codec(offered)
+        send_text(sock, chosen)
+        set_codec(sock, chosen)
+    return role
+
+async def recv_hello_async(sock):
+    """recv_hello 的 asyncio 版本"""
+    first = await recv_text_async(sock)
+    if first is None: return None
+    role, _, offered = first.partition(' ')
+    if offered:
+        chosen = _choose_codec(offered)
+        await send_text_async(sock, chosen)
+        set_codec(sock, chosen)
+    return role
+
+def _choose_codec(offered):
+    return next((c for c in offered.split(',') if c in CODECS), DEFAULT_CODEC.name)
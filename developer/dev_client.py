@@ -1,17 +1,39 @@
 import socket
 import os
 import sys
-from common import send_json, recv_json, send_file, send_text
+import tempfile
+from common import send_json, recv_json, send_file, send_hello, call, file_sha256, compress_file
 
 HOST = '140.113.17.12'
 PORT = 16211
 client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 client.connect((HOST, PORT))
-send_text(client, "hi")
+send_hello(client, "hi")
+
+def send_game_file(path):
+    """以 zlib 壓縮後上傳遊戲檔 (請求中需帶 'encoding': 'zlib')"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.zz')
+    os.close(fd)
+    try:
+        compress_file(path, tmp_path)
+        return send_file(client, tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+list_cache = {} # 查詢條件 -> 最近一次的列表回覆 (帶 version)
+
+def cached_call(request):
+    """帶上次拿到的 version 當 if_version，Server 回 not_modified 時沿用本地那份"""
+    key = tuple(sorted(request.items()))
+    cached = list_cache.get(key)
+    if cached: request = dict(request, if_version=cached['version'])
+    res = call(client, request)
+    if res and res.get('status') == 'not_modified' and cached: return cached
+    if res and res.get('status') == 'ok' and 'version' in res: list_cache[key] = res
+    return res
 
 def show_game_reviews(game_name):
-    send_json(client, {'cmd': 'get_reviews', 'name': game_name})
-    res = recv_json(client)
+    res = call(client, {'cmd': 'get_reviews', 'name': game_name})
     
     if not res or res.get('status') != 'ok':
         print(f"[錯誤] 無法獲取 {game_name} 的評論資訊")
@@ -33,8 +55,7 @@ def main(user_id, username):
         opt = input("選擇: ")
         
         if opt == '1': #查看遊戲列表
-            send_json(client, {'cmd': 'list_games', 'user_id': user_id})
-            res = recv_json(client)
+            res = cached_call({'cmd': 'list_catalog', 'user_id': user_id})
             if res.get('status') == 'ok':
                 games = res.get('games', {})
                 if not games:
@@ -48,12 +69,10 @@ def main(user_id, username):
                     ver = info.get('ver')
                     p_count = info.get('player_count') 
 
-                    send_json(client, {'cmd': 'get_reviews', 'name': name})
-                    rev_res = recv_json(client)
-                    reviews = rev_res.get('reviews', [])
-                    avg_rating = sum(r['rating'] for r in reviews) / len(reviews) if reviews else 0
+                    avg_rating = info.get('avg_rating', 0)
+                    review_count = info.get('review_count', 0)
 
-                    print(f"{i+1}. [{name}] [ver. {ver}][{p_count}人遊戲][評分: {avg_rating:.1f}][{len(reviews)}則評論]")
+                    print(f"{i+1}. [{name}] [ver. {ver}][{p_count}人遊戲][評分: {avg_rating:.1f}][{review_count}則評論]")
                     print(f"   遊戲簡介: {desc}")
 
                 while True:
@@ -102,15 +121,14 @@ def main(user_id, username):
                 except ValueError:
                     print("請輸入有效的數字 (大於1)")
             
-            send_json(client, {'cmd': 'upload', 'name': name, 'desc': desc,"user_id": user_id, "player_count": p_count, 'ver': ver_input})
+            send_json(client, {'cmd': 'upload', 'name': name, 'desc': desc,"user_id": user_id, "player_count": p_count, 'ver': ver_input, 'encoding': 'zlib'})
             
-            send_file(client, path)
+            send_game_file(path)
             res = recv_json(client)
             print(f"Server 回應: {res['msg']}")
 
         elif opt == '3': #更新遊戲
-            send_json(client, {'cmd': 'list_games', 'user_id': user_id})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'list_games', 'user_id': user_id})
             if res.get('status') == 'ok':
                 games = res.get('games', {})
                 if not games:
@@ -167,16 +185,17 @@ def main(user_id, username):
                 except ValueError:
                     print("請輸入有效的數字 (大於1)")
 
-            send_json(client, {'cmd': 'update_game', 'name': name, 'desc': desc, 'user_id': user_id, "player_count": p_count, 'ver': ver_input})
-            send_file(client, path)
-            res = recv_json(client)
-            print(f"Server 回應: {res.get('msg')}")
-            res = recv_json(client)
+            # 附上檔案 hash，內容沒變時 Server 只更新資訊，不必重傳檔案
+            sha256 = file_sha256(path).hexdigest()
+            res = call(client, {'cmd': 'update_game', 'name': name, 'desc': desc, 'user_id': user_id, "player_count": p_count, 'ver': ver_input, 'sha256': sha256, 'encoding': 'zlib'})
             print(f"Server 回應: {res.get('msg')}")
+            if res.get('status') == 'ready':
+                send_game_file(path)
+                res = recv_json(client)
+                print(f"Server 回應: {res.get('msg')}")
 
         elif opt == '4': #下架遊戲
-            send_json(client, {'cmd': 'list_games', 'user_id': user_id})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'list_games', 'user_id': user_id})
             if res.get('status') == 'ok':
                 games = res.get('games', {})
                 if not games:
@@ -206,13 +225,11 @@ def main(user_id, username):
                 except ValueError:
                     print(f"請輸入有效的數字。")
 
-            send_json(client, {'cmd': 'delete_game', 'name': name, 'user_id': user_id})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'delete_game', 'name': name, 'user_id': user_id})
             print(f"Server 回應:  {res.get('msg')}")
 
         elif opt == '5': #離開
-            send_json(client, {'cmd': 'logout', 'username': username})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'logout', 'username': username})
             if res.get('status') == 'ok':
                 print("已登出")
             break
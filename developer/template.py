@@ -6,11 +6,16 @@
 2. 實現以下函數：
    - check_win(): 檢查遊戲是否結束並返回勝者（P1, P2, P3... 或 Draw）。
    - print_board() / update_gui(): 打印遊戲狀態或更新圖形介面。
-   - run_server(): 處理多人連線、同步狀態並判定勝負。
+   - GameSession (繼承 GameServer): 只寫規則 —— on_start() 開局、on_message() 處理玩家操作、
+     on_timeout() 回合逾時；用 send() / broadcast() 傳送狀態，end() 結束。
+     連線與輸入由 SDK (game_sdk.py，測試時與遊戲放在同一個資料夾；上傳後 Server 與玩家端都有) 以 selectors 處理，
+     不需要自己開執行緒，同一個類別也能直接交給大廳的 game host 執行。
    - run_client(): 處理網路接收（需用 Threading 避免 GUI 卡死）與使用者操作。
 3. 確保遊戲支持以下參數格式：
    - server: python game.py server <port>
    - client: python game.py client <ip> <port> <P1|P2|P3...> 
+4. 狀態同步：開局送出 {"seq": 0, "snapshot": {...}}，之後每次變動只送 {"seq": n, "delta": {"路徑": 新值}}；
+   Client 以 StateMirror 套用，序號接不上時自動送出 SYNC 取得新的快照。
 """
 
 import sys
@@ -18,63 +23,41 @@ import socket
 import json
 import threading
 import time
+from game_sdk import GameServer, StateMirror, serve # 連線、多工、計時與狀態同步 (見 game_sdk.py)
 import tkinter as tk  # 用於 GUI 實作
 from tkinter import messagebox
 
 # ============================================
-# 1. 遊戲狀態管理 (GameState)
+# 1. 遊戲服務器 (Game Server) - 只需實作規則
 # ============================================
 
-class GameState:
-    def __init__(self, required_players):
-        self.required_players = required_players
-        self.players_info = {}  # 儲存角色與狀態
-        self.board = []         # 核心遊戲數據（如棋盤或手牌）
-        self.round = 1
-        self.active = True
-        self.winner = None
+class GameSession(GameServer):
+    player_count = 2
+    turn_timeout = 60
 
-# ============================================
-# 2. 遊戲服務器 (Game Server) - 支持多人
-# ============================================
+    def __init__(self, session):
+        super().__init__(session)
+        # 所有玩家共用的核心遊戲數據（如棋盤）；個人的資料（如手牌）另外存，用 send 只傳給本人
+        self.state = {"board": [], "round": 1, "turn": "P1"}
 
-def run_server(port, player_count=2):
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
-    try:
-        server.bind(('0.0.0.0', int(port)))
-        server.listen(player_count)
-        print(f"[SERVER] 監聽中，等待 {player_count} 名玩家連線...")
-        
-        player_conns = {}
-        player_files = {}
-        
-        # 建立多玩家連線
-        for i in range(player_count):
-            conn, addr = server.accept()
-            role = f"P{i+1}"
-            player_conns[role] = conn
-            player_files[role] = conn.makefile('r', encoding='utf-8')
-            print(f"[{role}] 已連線: {addr}")
-            
-            # 發送初始身分確認
-            init_data = {"status": "START", "role": role, "hand": []} # 範例數據
-            conn.sendall((json.dumps(init_data) + "\n").encode())
+    def on_start(self):
+        # 發送初始身分確認
+        for player in self.players:
+            self.send(player, {"status": "START", "role": player.role, "hand": []}) # 範例數據
+        self.send_snapshot()
+        self.start_turn()
 
-        # 遊戲主邏輯
-        try:
-            while True:
-                # TODO: 實現廣播與同步邏輯
-                # 使用 Thread 接收各玩家輸入以避免阻塞
-                pass
-        finally:
-            server.close()
-    except Exception as e:
-        print(f"Server Error: {e}")
+    def on_message(self, player, line):
+        # TODO: 解析玩家操作，只把變動的欄位交給 update()，例如 self.update({"round": 2, "turn": "P2"})；
+        #       遊戲結束時呼叫 self.end()
+        pass
+
+def run_server(port, player_count=2):
+    GameSession.player_count = player_count
+    serve(GameSession, port)
 
 # ============================================
-# 3. 遊戲客戶端 (Game Client) - 支持 GUI/CLI
+# 2. 遊戲客戶端 (Game Client) - 支持 GUI/CLI
 # ============================================
 
 class GameGUI:
@@ -84,6 +67,7 @@ class GameGUI:
         self.sock = sock
         self.sock_file = sock_file
         self.role = role
+        self.mirror = StateMirror(sock) # 套用 Server 送來的快照與變更，self.mirror.state 是完整狀態
         
         # 簡單 UI 範例
         self.label = tk.Label(self.root, text=f"你是 {role}，遊戲進行中...")
@@ -98,6 +82,8 @@ class GameGUI:
             line = self.sock_file.readline()
             if not line: break
             data = json.loads(line.strip())
+            if not self.mirror.apply(data): continue # 個人訊息 (START) 或等待重新同步
+            data = dict(self.mirror.state)
             # 更新介面
             self.root.after(0, lambda: self.label.config(text=f"回合: {data.get('round')}"))
 
@@ -113,7 +99,7 @@ def run_client(ip, port, role):
         print(f"連線失敗: {e}")
 
 # ============================================
-# 4. 主程序入口
+# 3. 主程序入口
 # ============================================
 
 if __name__ == "__main__":
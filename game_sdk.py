@@ -0,0 +1,260 @@
+import json
+import time
+import socket
+import selectors
+
+#遊戲開發用的 Game Server SDK：遊戲 (見 developer/template.py) 只要 from game_sdk import ... 並實作規則，
+#連線、多人輸入的多工、回合計時與狀態同步都在這裡。
+#Server 端 (game_worker / game_host) 與玩家端 (player_client 啟動遊戲時) 都會提供這個檔案，
+#所以遊戲上傳時仍然只有單一檔案，不必把 SDK 複製進遊戲裡。
+#
+#同步協定 (一行一個 JSON)：開局 {"seq": 0, "snapshot": {...}}，之後每次變動 {"seq": n, "delta": {"路徑": 新值}}；
+#Client 序號接不上時送出一行 SYNC (RESYNC)，Server 單獨回傳完整快照。
+
+RESYNC = 'SYNC' # Client 落後或重新連線時送出這一行，要求重新傳送完整狀態
+
+def encode_line(msg):
+    """dict 等送成一行 JSON，字串原樣送出 (都補上換行)"""
+    if not isinstance(msg, str): msg = json.dumps(msg)
+    return (msg + "\n").encode('utf-8')
+
+def apply_patch(state, delta):
+    """
+    套用狀態變更：delta 是 {路徑: 新值}，路徑以 . 分隔 (list 用索引)，例如 {"board.4": "O", "turn": "P2"}。
+    Server 與 Client 用同一個函數，兩邊的狀態就會一致。
+    """
+    for path, value in delta.items():
+        *parents, last = path.split('.')
+        target = state
+        for key in parents:
+            target = target[int(key)] if isinstance(target, list) else target[key]
+        if isinstance(target, list): target[int(last)] = value
+        else: target[last] = value
+    return state
+
+class StateMirror:
+    """
+    Client 端的狀態副本：收到 {"seq", "snapshot"} 整份取代，{"seq", "delta"} 依序號套用。
+    序號接不上 (漏掉訊息) 時送出 RESYNC，在新的快照到達之前忽略之後的 delta。
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.state = None
+        self.seq = None
+        self.waiting = False # 已要求快照，還沒收到
+
+    def apply(self, msg):
+        """處理一則同步訊息，狀態有更新時回傳 True"""
+        if 'snapshot' in msg:
+            self.state, self.seq, self.waiting = msg['snapshot'], msg['seq'], False
+            return True
+        if 'delta' not in msg: return False
+        if self.state is None or msg['seq'] != self.seq + 1:
+            if not self.waiting:
+                self.waiting = True
+                self.sock.sendall(encode_line(RESYNC))
+            return False
+        apply_patch(self.state, msg['delta'])
+        self.seq = msg['seq']
+        return True
+
+class Player:
+    def __init__(self, index, sock):
+        self.index = index          # 連線順序，從 0 起
+        self.role = f'P{index + 1}'
+        self.sock = sock
+        self.buffer = b''
+
+class Timer:
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class LocalSession:
+    """
+    python game.py server <port> 時使用的 session：單執行緒，用 selectors 同時等待所有玩家的輸入與計時器，
+    不必每回合開執行緒、也不會空轉。大廳的 game host 提供相同的介面 (players / send / broadcast / end / set_timer)。
+    """
+    def __init__(self, game_cls, port):
+        self.players = []
+        self.timers = []
+        self.ended = False
+        self.selector = selectors.DefaultSelector()
+        self.game = game_cls(self)
+        self.player_count = getattr(self.game, 'player_count', 2)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('0.0.0.0', int(port)))
+        self.server.listen(self.player_count)
+        self.selector.register(self.server, selectors.EVENT_READ)
+        print(f"[GAME SERVER] Listening on {port}，等待 {self.player_count} 名玩家連線...")
+
+    def send(self, player, msg):
+        try:
+            player.sock.sendall(encode_line(msg))
+        except OSError:
+            pass
+
+    def broadcast(self, msg):
+        data = encode_line(msg) # 只編碼一次
+        for player in self.players:
+            try:
+                player.sock.sendall(data)
+            except OSError:
+                pass
+
+    def end(self):
+        self.ended = True
+
+    def set_timer(self, seconds, callback):
+        """seconds 秒後呼叫 callback，回傳的物件可以 cancel()"""
+        timer = Timer(time.monotonic() + seconds, callback)
+        self.timers.append(timer)
+        return timer
+
+    def _call(self, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Server Error: {e}")
+            self.end()
+
+    def _accept(self):
+        conn, addr = self.server.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        player = Player(len(self.players), conn)
+        self.players.append(player)
+        self.selector.register(conn, selectors.EVENT_READ, player)
+        print(f"Player {player.index + 1} connected: {addr}")
+        if len(self.players) == self.player_count: # 人數到齊，不再接受連線
+            self.selector.unregister(self.server)
+            self.server.close()
+        self._call(self.game.on_join, player)
+
+    def _dispatch(self, player, line):
+        if line == RESYNC: self._call(self.game.on_resync, player)
+        else: self._call(self.game.on_message, player, line)
+
+    def _read(self, player):
+        try:
+            data = player.sock.recv(4096)
+        except ConnectionError:
+            data = b''
+        if not data:
+            print(f"{player.role} 斷線")
+            self.selector.unregister(player.sock)
+            self._call(self.game.on_leave, player)
+            return
+        player.buffer += data
+        while b"\n" in player.buffer and not self.ended:
+            line, player.buffer = player.buffer.split(b"\n", 1)
+            self._dispatch(player, line.decode('utf-8', 'replace').strip())
+
+    def _run_timers(self):
+        now = time.monotonic()
+        due = [t for t in self.timers if t.deadline <= now or t.cancelled]
+        self.timers = [t for t in self.timers if t not in due]
+        for timer in due:
+            if not timer.cancelled and not self.ended: self._call(timer.callback)
+
+    def run(self):
+        try:
+            while not self.ended:
+                self._run_timers()
+                if self.ended: break
+                timeout = None
+                if self.timers:
+                    timeout = max(0, min(t.deadline for t in self.timers) - time.monotonic())
+                for key, _ in self.selector.select(timeout):
+                    if self.ended: break
+                    if key.data is None: self._accept()
+                    else: self._read(key.data)
+        finally:
+            for player in self.players:
+                player.sock.close()
+            if self.server.fileno() != -1: self.server.close()
+            self.selector.close()
+            print("Server 關閉")
+
+def serve(game_cls, port):
+    """以單一行程執行一局 (大廳的 game host 則會直接使用 GameSession 類別)"""
+    LocalSession(game_cls, port).run()
+
+class GameServer:
+    """
+    遊戲 Server 的基底類別：連線、讀取所有玩家的輸入、計時都由 session 處理，遊戲只要實作規則。
+    繼承後覆寫 on_start / on_message (需要時再加 on_timeout / on_leave)，並把類別命名為 GameSession。
+    所有玩家共用的狀態放在 self.state：開局用 send_snapshot() 送出整份，之後用 update() 只廣播變更的部分
+    (附序號，Client 以 StateMirror 套用)，狀態變大時每一步的傳輸量仍然固定。
+    """
+    player_count = 2
+    turn_timeout = None # 每回合的秒數 (None 表示不限時)；start_turn() 開始計時，逾時呼叫 on_timeout()
+
+    def __init__(self, session):
+        self.session = session
+        self.turn_timer = None
+        self.state = {} # 所有玩家共用的遊戲狀態
+        self.seq = 0    # 已廣播的變更序號
+
+    @property
+    def players(self):
+        return self.session.players
+
+    def send(self, player, msg):
+        self.session.send(player, msg)
+
+    def broadcast(self, msg):
+        self.session.broadcast(msg)
+
+    def end(self):
+        self.stop_turn()
+        self.session.end()
+
+    def send_snapshot(self, player=None):
+        """送出完整狀態 (player 為 None 時廣播)"""
+        msg = {'seq': self.seq, 'snapshot': self.state}
+        if player is None: self.broadcast(msg)
+        else: self.send(player, msg)
+
+    def update(self, delta):
+        """套用變更 (格式見 apply_patch) 並只廣播這些變更，序號加一"""
+        apply_patch(self.state, delta)
+        self.seq += 1
+        self.broadcast({'seq': self.seq, 'delta': delta})
+
+    def start_turn(self):
+        self.stop_turn()
+        if self.turn_timeout: self.turn_timer = self.session.set_timer(self.turn_timeout, self.on_timeout)
+
+    def stop_turn(self):
+        if self.turn_timer:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+
+    # ---- 以下由遊戲覆寫 ----
+    def on_join(self, player):
+        """玩家連上；預設人數到齊時呼叫 on_start()"""
+        if len(self.players) == self.player_count: self.on_start()
+
+    def on_start(self):
+        pass
+
+    def on_message(self, player, line):
+        """收到玩家的一行訊息 (已去掉換行)"""
+        pass
+
+    def on_resync(self, player):
+        """Client 要求重新同步 (RESYNC)：單獨送完整狀態給他"""
+        self.send_snapshot(player)
+
+    def on_timeout(self):
+        self.end()
+
+    def on_leave(self, player):
+        """玩家斷線；預設直接結束這局"""
+        self.end()
+
@@ -4,7 +4,10 @@ import sys
 import subprocess
 import threading
 import json
-from common import send_json, recv_json, recv_file, send_text
+import glob
+import hashlib
+import shutil
+from common import send_json, recv_json, recv_file, send_hello, call, recv_push, file_sha256, decompress_file, apply_delta
 
 def check_environment():
     if sys.version_info < (3, 10):
@@ -55,13 +58,207 @@ def get_download_dir(username):
 client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 try:
     client.connect((HOST, PORT))
-    send_text(client, "hi")
+    send_hello(client, "hi")
 except:
     print("連線失敗")
 
+def local_copy_matches(name, game_info, download_dir, local_games_db):
+    """本地檔案的 SHA-256 與 Server 相同時回傳 True (順便把本地記錄同步成 Server 的版本資訊)"""
+    sha256 = game_info.get('sha256')
+    file_path = os.path.join(download_dir, f"{name}.py")
+    if not sha256 or name not in local_games_db or not os.path.exists(file_path):
+        return False
+    if file_sha256(file_path).hexdigest() != sha256:
+        return False
+    local_games_db[name].update({
+        'ver': game_info.get('ver'),
+        'player_count': game_info.get('player_count'),
+        'desc': game_info.get('desc'),
+        'sha256': sha256
+    })
+    save_local_games(download_dir, local_games_db)
+    return True
+
+def download_delta(name, game_info, download_dir):
+    """
+    本地已有舊版時只下載差異檔，套用後驗證 SHA-256。
+    成功回傳 Server 的回覆 (含新版本的 ver / sha256)；沒有差異檔或任何錯誤回傳 None (改下載完整檔案)。
+    """
+    file_path = os.path.join(download_dir, f"{name}.py")
+    if not os.path.exists(file_path) or not game_info.get('sha256'): return None
+    delta_path = file_path + '.delta.part'
+    req = {'cmd': 'download_delta', 'name': name, 'from_sha256': file_sha256(file_path).hexdigest(),
+           'to_sha256': game_info['sha256']}
+    res = call(client, req)
+    if not res or res.get('status') != 'ok': return None
+    if not recv_file(client, delta_path): return None
+    digest = hashlib.sha256()
+    try:
+        apply_delta(file_path, delta_path, file_path + '.tmp', hasher=digest)
+        if digest.hexdigest() != res['sha256']:
+            raise ValueError("SHA-256 不符")
+    except Exception as e:
+        print(f"套用差異檔失敗 ({e})，改為下載完整檔案")
+        if os.path.exists(file_path + '.tmp'): os.remove(file_path + '.tmp')
+        return None
+    finally:
+        if os.path.exists(delta_path): os.remove(delta_path)
+    os.replace(file_path + '.tmp', file_path)
+    print(f"已透過差異檔更新 (ver. {res['from_ver']} -> ver. {res['ver']}，{res['size']} bytes)")
+    return res
+
+def download_game(name, game_info, download_dir, local_games_db):
+    """
+    下載遊戲到 download_dir。本地已有舊版時先試著只下載差異檔 (download_delta)。
+    完整下載以 zlib 壓縮傳輸，先寫到 <name>.py.<hash 或版本>.zlib.part，
+    連線中斷時保留已收到的部分，下次 (重新連線後) 從目前大小續傳。
+    收完後解壓並計算 SHA-256，與 Server 的不符就丟棄。
+    """
+    ver = game_info.get('ver')
+    sha256 = game_info.get('sha256')
+    file_path = os.path.join(download_dir, f"{name}.py")
+    res = download_delta(name, game_info, download_dir)
+    if res:
+        local_games_db[name] = {
+            'ver': res['ver'],
+            'player_count': game_info.get('player_count'),
+            'desc': game_info.get('desc'),
+            'sha256': res['sha256']
+        }
+        save_local_games(download_dir, local_games_db)
+        return True
+    part_path = f"{file_path}.{sha256[:16] if sha256 else f'v{ver}'}.zlib.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset:
+        print(f"偵測到未完成的下載，從 {offset} bytes 處續傳...")
+
+    req = {'cmd': 'download', 'name': name, 'ver': ver, 'offset': offset, 'compress': 'zlib'}
+    if sha256: req['sha256'] = sha256
+    res = call(client, req)
+    if not res or res.get('status') != 'ok':
+        if res and res.get('code') in ('stale_range', 'bad_range', 'version_gone') and os.path.exists(part_path):
+            os.remove(part_path) # 舊的進度不能用了，下次從頭下載
+        print(f"下載失敗: {res.get('msg', '未知錯誤') if res else '無回應'}")
+        return False
+
+    if not recv_file(client, part_path, append=offset > 0):
+        print("下載中斷，已保留進度，重新連線後再次下載會自動續傳。")
+        return False
+    digest = hashlib.sha256()
+    try:
+        if os.path.getsize(part_path) != res['size']:
+            raise ValueError("文件大小不符")
+        if res.get('encoding') == 'zlib':
+            decompress_file(part_path, file_path + '.tmp', hasher=digest)
+        else:
+            file_sha256(part_path, digest)
+            shutil.copyfile(part_path, file_path + '.tmp')
+        if res.get('sha256') and digest.hexdigest() != res['sha256']:
+            raise ValueError("SHA-256 不符")
+    except Exception as e:
+        print(f"下載失敗：文件校驗錯誤 ({e})")
+        for path in (part_path, file_path + '.tmp'):
+            if os.path.exists(path): os.remove(path)
+        return False
+    os.replace(file_path + '.tmp', file_path)
+    for stale in glob.glob(glob.escape(file_path) + ".*.part"):
+        os.remove(stale)
+
+    local_games_db[name] = {
+        'ver': res.get('ver', ver),
+        'player_count': game_info.get('player_count'),
+        'desc': game_info.get('desc'),
+        'sha256': res.get('sha256')
+    }
+    save_local_games(download_dir, local_games_db)
+    return True
+
+list_cache = {} # 查詢條件 -> 最近一次的列表回覆 (帶 version)
+
+def cached_call(request):
+    """
+    list_all_games / list_catalog：帶上次拿到的 version 當 if_version，
+    Server 回 not_modified 時直接沿用本地那份，不必重傳整個列表。
+    """
+    key = tuple(sorted(request.items()))
+    cached = list_cache.get(key)
+    if cached: request = dict(request, if_version=cached['version'])
+    res = call(client, request)
+    if res and res.get('status') == 'not_modified' and cached: return cached
+    if res and res.get('status') == 'ok' and 'version' in res: list_cache[key] = res
+    return res
+
+PAGE_SIZE = 10 #商城每頁顯示的遊戲數
+CATALOG_SORTS = [('name', '名稱'), ('newest', '最新上架'), ('rating', '評分'), ('play_count', '遊玩次數')]
+
+def browse_catalog(prompt, show_stats=True):
+    """
+    分頁瀏覽商城 (排序、搜尋、切頁都在 Server 端做，每次只拿一頁)。
+    回傳選中的 (遊戲名稱, 遊戲資訊)，返回或沒有遊戲時回傳 None。
+    """
+    offset, sort, keyword = 0, 'name', None
+    while True:
+        if keyword:
+            res = call(client, {'cmd': 'search_games', 'query': keyword, 'offset': offset, 'limit': PAGE_SIZE})
+        else:
+            res = cached_call({'cmd': 'list_catalog', 'offset': offset, 'limit': PAGE_SIZE, 'sort': sort})
+        if not res or res.get('status') != 'ok':
+            print("獲取遊戲列表失敗")
+            return None
+        games = res['games']
+        total = res.get('total', len(games))
+        if not total and keyword:
+            print(f"找不到符合「{keyword}」的遊戲，回到完整列表。")
+            offset, keyword = 0, None
+            continue
+        if not total:
+            print("目前沒有可用的遊戲")
+            return None
+        if not games: # 列表變短了，回到第一頁
+            offset = 0
+            continue
+
+        game_names_list = list(games.keys())
+        title = f"搜尋「{keyword}」" if keyword else "商城列表"
+        print(f"--- {title} (第 {offset + 1}-{offset + len(games)} 款，共 {total} 款) ---")
+        for i, name in enumerate(game_names_list):
+            info = games[name]
+            line = f"{offset + i + 1}.[{name}] [ver. {info.get('ver')}][{info.get('player_count')}人遊戲]"
+            if show_stats:
+                line += f"[評分: {info.get('avg_rating', 0):.1f}][{info.get('review_count', 0)}則評論]"
+            print(f"{line}\n 遊戲簡介: {info.get('desc')}")
+
+        choice = input(f"\n{prompt} (n:下一頁 p:上一頁 s:排序 f:搜尋 0:返回): ").strip().lower()
+        if choice == '0': return None
+        if choice == 'n':
+            if res.get('next_offset') is None: print("已經是最後一頁。")
+            else: offset = res['next_offset']
+        elif choice == 'p':
+            if offset == 0: print("已經是第一頁。")
+            else: offset = max(0, offset - PAGE_SIZE)
+        elif choice == 's':
+            print(" ".join(f"{i + 1}.{label}" for i, (_, label) in enumerate(CATALOG_SORTS)))
+            try:
+                sort = CATALOG_SORTS[int(input("排序方式: ")) - 1][0]
+                offset, keyword = 0, None
+            except (ValueError, IndexError):
+                print("排序方式無效。")
+        elif choice == 'f':
+            keyword = input("搜尋關鍵字 (遊戲名稱或簡介，直接 Enter 回到完整列表): ").strip() or None
+            offset = 0
+        else:
+            try:
+                choice_num = int(choice)
+            except ValueError:
+                print("請輸入有效的數字。")
+                continue
+            if offset < choice_num <= offset + len(game_names_list):
+                name = game_names_list[choice_num - offset - 1]
+                return name, games[name]
+            print("編號無效，請重新輸入。")
+
 def show_reviews_and_rate(game_name):
-    send_json(client, {'cmd': 'get_reviews', 'name': game_name})
-    res = recv_json(client)
+    res = call(client, {'cmd': 'get_reviews', 'name': game_name})
     print(f"\n=== {game_name} 的評論 ===")
     reviews = res.get('reviews', [])
     if not reviews: print("目前尚無評論。")
@@ -81,22 +278,21 @@ def show_reviews_and_rate(game_name):
                 print("評論過長，已自動截斷。")
                 comment = comment[:50]
                 
-            send_json(client, {
+            result = call(client, {
                 'cmd': 'submit_review', 
                 'name': game_name, 
                 'rating': rating, 
                 'comment': comment
             })
-            result = recv_json(client)
             print(result.get('msg'))
         except ValueError:
             print("請輸入有效的數字。")
     
-def wait_for_game_start(sock, download_dir):
+def wait_for_game_start(sock, download_dir, local_games_db):
     """在房間內等待 Server 通知遊戲開始"""
     print("正在等待其他玩家加入...")
     while True:
-        res = recv_json(sock)
+        res = recv_push(sock)
         if not res: 
             print("not receive any response from server")
             break
@@ -108,17 +304,31 @@ def wait_for_game_start(sock, download_dir):
             role = res['role'] 
             
             script_path = os.path.join(download_dir, f"{game_name}.py")
+            # 遊戲 Server 跑的版本與本地不同 (例如剛好在等待時更新了)：下載那個版本 (Server 仍保留著)
+            if res.get('sha256') and (not os.path.exists(script_path)
+                                      or file_sha256(script_path).hexdigest() != res['sha256']):
+                print("本地遊戲版本與本局不同，正在下載本局使用的版本...")
+                game_info = dict(local_games_db.get(game_name, {}), ver=res.get('ver'), sha256=res['sha256'])
+                if not download_game(game_name, game_info, download_dir, local_games_db):
+                    print("下載失敗，無法加入本局遊戲。")
+                    break
             print(f"正在啟動 {game_name} (Port {game_port})...")
             
             # 呼叫 subprocess 執行下載下來的 python 檔
             # 參數格式: python tictactoe.py client <IP> <PORT> <ROLE>
+            # 遊戲放在 player_downloads 底下，把本程式所在的資料夾加進 PYTHONPATH，遊戲才 import 得到 game_sdk.py
+            sdk_dir = os.path.dirname(os.path.abspath(__file__))
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [sdk_dir, os.environ.get('PYTHONPATH')])))
             subprocess.call([
                 sys.executable, script_path, 
                 'client', HOST, str(game_port), role
-            ]) 
+            ], env=env) 
             
             print("遊戲結束，回到大廳。")
             break
+        elif res.get('push') == 'room_closed':
+            print(res.get('msg'))
+            break
         else:
             print(f"Sever回覆{res['status']}")
 
@@ -131,96 +341,21 @@ def main(username):
         choice = input("選擇(1~6): ")
 
         if choice == '1': #查看遊戲評論
-            send_json(client, {'cmd': 'list_all_games'})
-            res = recv_json(client)
-            print("--- 商城列表 ---")
-            if res and res.get('status') == 'ok' and 'games' in res:
-                games = res['games']
-                if games:
-                    game_names_list = list(games.keys())
-                    for i, name in enumerate(game_names_list):
-                        info = games[name]
-                        desc = info.get('desc')
-                        ver = info.get('ver')
-                        p_count = info.get('player_count')
-
-                        send_json(client, {'cmd': 'get_reviews', 'name': name})
-                        rev_res = recv_json(client)
-                        reviews = rev_res.get('reviews', [])
-                        avg_rating = sum(r['rating'] for r in reviews) / len(reviews) if reviews else 0
-
-                        print(f"{i+1}.[{name}] [ver. {ver}][{p_count}人遊戲][評分: {avg_rating:.1f}][{len(reviews)}則評論]\n 遊戲簡介: {desc}")
-
-                    while True:
-                        try:
-                            choice_num = int(input(f"\n請輸入要查看評論的遊戲編號 (1-{len(game_names_list)})或輸入0返回: "))
-                            if choice_num == 0: break
-                            if 1 <= choice_num <= len(game_names_list):
-                                name = game_names_list[choice_num - 1] 
-                                show_reviews_and_rate(name)
-                                break
-                            else:
-                                print("編號無效，請重新輸入。")
-                        except ValueError:
-                            print("請輸入有效的數字。")
-                else:
-                    print("目前沒有可用的遊戲")
-            else:
-                print("獲取遊戲列表失敗")
+            picked = browse_catalog("請輸入要查看評論的遊戲編號")
+            if picked:
+                show_reviews_and_rate(picked[0])
 
         elif choice == '2': #下載遊戲
-            send_json(client, {'cmd': 'list_all_games'})
-            res = recv_json(client)
-            if res and res.get('status') == 'ok' and 'games' in res:
-                games = res['games']
-                print("--- 商城列表 ---")
-                if games:
-                    game_names_list = list(games.keys())
-                    for i, name in enumerate(game_names_list):
-                        info = games[name]
-                        desc = info.get('desc')
-                        ver = info.get('ver')
-                        p_count = info.get('player_count')
-                        print(f"{i+1}. [{name}] [ver. {ver}][{p_count}人遊戲] 遊戲簡介: {desc}")
-
-                    while True:
-                        try:
-                            choice_num = int(input(f"\n請輸入要下載的遊戲編號 (1-{len(game_names_list)}): "))
-                            if 1 <= choice_num <= len(game_names_list):
-                                name = game_names_list[choice_num - 1] 
-                                break
-                            else:
-                                print("編號無效，請重新輸入。")
-                        except ValueError:
-                            print("請輸入有效的數字。")
-
-                    send_json(client, {'cmd': 'download', 'name': name})
-                    download_res = recv_json(client)
-                    if download_res and download_res.get('status') == 'ok':
-                        file_path = os.path.join(DOWNLOAD_DIR, f"{name}.py")
-                        if recv_file(client, file_path):
-                            print(f"下載完成！文件保存在: {file_path}")
-
-                            #更新本地記錄
-                            game_info = games[name]
-                            local_games_db[name] = {
-                                'ver': game_info.get('ver'),
-                                'player_count': game_info.get('player_count'),
-                                'desc': game_info.get('desc')
-                            }
-                            save_local_games(DOWNLOAD_DIR, local_games_db)
-                        else:
-                            print("下載失敗：文件接收錯誤")
-                    else:
-                        print(f"下載失敗: {download_res.get('msg', '未知錯誤') if download_res else '無回應'}")
-                else:
-                    print("目前沒有可用的遊戲")
-            else:
-                print("獲取遊戲列表失敗")
+            picked = browse_catalog("請輸入要下載的遊戲編號", show_stats=False)
+            if picked:
+                name, game_info = picked
+                if local_copy_matches(name, game_info, DOWNLOAD_DIR, local_games_db):
+                    print("本地檔案已是最新內容，不需重新下載。")
+                elif download_game(name, game_info, DOWNLOAD_DIR, local_games_db):
+                    print(f"下載完成！文件保存在: {os.path.join(DOWNLOAD_DIR, f'{name}.py')}")
 
         elif choice == '3': #瀏覽房間
-            send_json(client, {'cmd': 'list_rooms'})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'list_rooms'})
             if res and res.get('status') == 'ok' and 'rooms' in res:
                 print("--- 房間列表 ---")
                 if res['rooms']:
@@ -232,37 +367,9 @@ def main(username):
                 print("獲取房間列表失敗")
 
         elif choice == '4': #建立房間
-            send_json(client, {'cmd': 'list_all_games'})
-            res = recv_json(client)
-            if res and res.get('status') == 'ok' and 'games' in res:
-                games = res['games']
-                print("--- 商城列表 ---")
-                if games:
-                    game_names_list = list(games.keys())
-                    for i, name in enumerate(game_names_list):
-                        info = games[name]
-                        desc = info.get('desc')
-                        ver = info.get('ver')
-                        p_count = info.get('player_count')
-                        print(f"{i+1}. [{name}] [ver. {ver}][{p_count}人遊戲] 遊戲簡介: {desc}")
-                    while True:
-                        try:
-                            choice_num = int(input(f"請輸入想玩的遊戲編號 (1-{len(game_names_list)}): "))
-                            if 1 <= choice_num <= len(game_names_list):
-                                game = game_names_list[choice_num - 1]
-                                break
-                            else:
-                                print("編號無效，請重新輸入。")
-                        except ValueError:
-                            print("請輸入有效的數字。")
-                else:
-                    print("目前沒有可用的遊戲")
-                    continue
-            else:
-                print("獲取遊戲列表失敗")
-                continue
-            
-            game_info = games[game]
+            picked = browse_catalog("請輸入想玩的遊戲編號", show_stats=False)
+            if not picked: continue
+            game, game_info = picked
             server_ver = game_info.get('ver', 1)
 
             local_info = local_games_db.get(game)
@@ -271,39 +378,23 @@ def main(username):
                 continue      
             local_ver = local_info.get('ver', 1)
 
-            if local_ver != server_ver:
+            if local_ver != server_ver and not local_copy_matches(game, game_info, DOWNLOAD_DIR, local_games_db):
                 print(f"您的遊戲版本為 {local_ver}，最新版本為 {server_ver}。 正在更新遊戲版本...\n")
-                send_json(client, {'cmd': 'download', 'name': game})
-                download_res = recv_json(client)
-                if download_res and download_res.get('status') == 'ok':
-                    file_path = os.path.join(DOWNLOAD_DIR, f"{game}.py")
-                    if recv_file(client, file_path):
-                        print("遊戲更新完成! 請再次選擇 4.建立房間。")
-                        local_games_db[game] = {
-                            'ver': server_ver,
-                            'player_count': game_info.get('player_count'),
-                            'desc': game_info.get('desc')
-                        }
-                        save_local_games(DOWNLOAD_DIR, local_games_db)
-                        continue
-                    else:
-                        print("文件接收錯誤，更新失敗。")
-                        continue
+                if download_game(game, game_info, DOWNLOAD_DIR, local_games_db):
+                    print("遊戲更新完成! 請再次選擇 4.建立房間。")
                 else:
-                    print(f"更新失敗: {download_res.get('msg')}")
-                    continue
+                    print("更新失敗。")
+                continue
 
-            send_json(client, {'cmd': 'create_room', 'game_name': game})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'create_room', 'game_name': game})
             if res['status'] == 'ok':
                 print(f"房間建立成功 (ID: {res['room_id']})")
-                wait_for_game_start(client, DOWNLOAD_DIR) # 進入等待模式
+                wait_for_game_start(client, DOWNLOAD_DIR, local_games_db) # 進入等待模式
             else:
                 print(f"創建房間失敗: {res.get('msg', '未知錯誤')}")
 
         elif choice == '5': #加入房間
-            send_json(client, {'cmd': 'list_rooms'})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'list_rooms'})
 
             rooms_data = {}
             if res and res.get('status') == 'ok' and 'rooms' in res:
@@ -340,8 +431,7 @@ def main(username):
                 continue  
             local_ver = local_info.get('ver', 1)
 
-            send_json(client, {'cmd': 'list_all_games'})
-            game_list_res = recv_json(client)
+            game_list_res = cached_call({'cmd': 'list_all_games'})
             games = game_list_res.get('games', {})
             game_info = games.get(game_to_join)
             if game_info is None:
@@ -349,40 +439,24 @@ def main(username):
                 continue
             server_ver = game_info.get('ver', 1)
 
-            if local_ver != server_ver:
+            if local_ver != server_ver and not local_copy_matches(game_to_join, game_info, DOWNLOAD_DIR, local_games_db):
                 print(f"您的遊戲版本為 {local_ver}，最新版本為 {server_ver}。 正在更新遊戲版本...\n")
-                send_json(client, {'cmd': 'download', 'name': game_to_join})
-                download_res = recv_json(client)
-                if download_res and download_res.get('status') == 'ok':
-                    file_path = os.path.join(DOWNLOAD_DIR, f"{game_to_join}.py")
-                    if recv_file(client, file_path):
-                        print("遊戲更新完成! 請再次選擇 5.加入房間。")
-                        local_games_db[game_to_join] = {
-                            'ver': server_ver,
-                            'player_count': game_info.get('player_count'),
-                            'desc': game_info.get('desc')
-                        }
-                        save_local_games(DOWNLOAD_DIR, local_games_db)
-                        continue
-                    else:
-                        print("文件接收錯誤，更新失敗。")
-                        continue
+                if download_game(game_to_join, game_info, DOWNLOAD_DIR, local_games_db):
+                    print("遊戲更新完成! 請再次選擇 5.加入房間。")
                 else:
-                    print(f"更新失敗: {download_res.get('msg')}")
-                    continue
+                    print("更新失敗。")
+                continue
 
-            send_json(client, {'cmd': 'join_room', 'room_id': rid})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'join_room', 'room_id': rid})
             if res and res.get('status') == 'ok':
-                wait_for_game_start(client, DOWNLOAD_DIR)
+                wait_for_game_start(client, DOWNLOAD_DIR, local_games_db)
             else:
                 msg = res.get('msg', '未知錯誤')
                 print(f"\n[加入失敗] Server回覆: {msg}")
 
         elif choice == '6': #離開
             print(f"正在登出用戶: {username}")
-            send_json(client, {'cmd': 'logout', 'username': username})
-            res = recv_json(client)
+            res = call(client, {'cmd': 'logout', 'username': username})
             print(f"Server回應: {res.get('msg')}")
             if res and res.get('status') == 'ok':
                 print("已登出")
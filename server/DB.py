@@ -4,13 +4,22 @@ import struct
 import threading
 import sqlite3
 import uuid #生成唯一ID
-from common import send_json, recv_json, send_text
+from concurrent.futures import ThreadPoolExecutor
+from common import send_json, recv_json, send_hello
 
 inv_lock = threading.Lock()
 FORMAT = 'utf-8'
 DB_PATH = "all_info.db"
 PORT = 16211
 SERVER = '140.113.17.12'
+DB_WORKERS = 8 #同時處理請求的執行緒數量
+STMT_CACHE = 64 #每條連線快取的 prepared statement 數量
+
+#只讀不寫的 op 走唯讀連線
+READ_OPS = {"get_user_by_name", "check_play_eligibility", "get_game_reviews", "get_game_stats"}
+
+#每個 worker 執行緒各自保留連線 (sqlite3 連線不能跨執行緒共用)
+_local = threading.local()
 
 def init_db():
     with sqlite3.connect(DB_PATH) as conn:
@@ -31,14 +40,16 @@ def init_db():
         conn.execute("CREATE INDEX IF NOT EXISTS idx_user_name ON User(name);")
         conn.execute("UPDATE User SET is_connected = 0")
 
-        #遊玩紀錄表
+        #遊玩紀錄表：每個 (玩家, 遊戲) 一列，play_count 記遊玩次數、play_time 記最後一次
+        migrate_play_record(conn)
         conn.execute("""
         CREATE TABLE IF NOT EXISTS PlayRecord (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT NOT NULL,
             game_name TEXT NOT NULL,
-            play_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+            play_count INTEGER NOT NULL DEFAULT 1,
+            play_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, game_name)
+        ) WITHOUT ROWID;
         """)
 
         # 評論表
@@ -53,8 +64,151 @@ def init_db():
             review_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_review_game_time ON Review(game_name, review_time);")
+
+        # 每款遊戲的統計 (評論數、評分總和、1~5 星分布、遊玩次數)，由下方 trigger 在同一個交易裡維護
+        has_stats = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'GameStats'").fetchone()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS GameStats (
+            game_name TEXT PRIMARY KEY,
+            review_count INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            star1 INTEGER NOT NULL DEFAULT 0,
+            star2 INTEGER NOT NULL DEFAULT 0,
+            star3 INTEGER NOT NULL DEFAULT 0,
+            star4 INTEGER NOT NULL DEFAULT 0,
+            star5 INTEGER NOT NULL DEFAULT 0,
+            play_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        """)
+        if not has_stats: rebuild_game_stats(conn)
+
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_review_stats AFTER INSERT ON Review
+        BEGIN
+            INSERT INTO GameStats (game_name) VALUES (NEW.game_name) ON CONFLICT DO NOTHING;
+            UPDATE GameStats SET
+                review_count = review_count + 1,
+                rating_sum = rating_sum + NEW.rating,
+                star1 = star1 + (NEW.rating = 1),
+                star2 = star2 + (NEW.rating = 2),
+                star3 = star3 + (NEW.rating = 3),
+                star4 = star4 + (NEW.rating = 4),
+                star5 = star5 + (NEW.rating = 5)
+            WHERE game_name = NEW.game_name;
+        END;
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_review_stats_del AFTER DELETE ON Review
+        BEGIN
+            UPDATE GameStats SET
+                review_count = review_count - 1,
+                rating_sum = rating_sum - OLD.rating,
+                star1 = star1 - (OLD.rating = 1),
+                star2 = star2 - (OLD.rating = 2),
+                star3 = star3 - (OLD.rating = 3),
+                star4 = star4 - (OLD.rating = 4),
+                star5 = star5 - (OLD.rating = 5)
+            WHERE game_name = OLD.game_name;
+        END;
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_play_stats AFTER INSERT ON PlayRecord
+        BEGIN
+            INSERT INTO GameStats (game_name, play_count) VALUES (NEW.game_name, NEW.play_count)
+            ON CONFLICT (game_name) DO UPDATE SET play_count = play_count + NEW.play_count;
+        END;
+        """)
+        conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_play_stats_upd AFTER UPDATE OF play_count ON PlayRecord
+        BEGIN
+            UPDATE GameStats SET play_count = play_count + NEW.play_count - OLD.play_count
+            WHERE game_name = NEW.game_name;
+        END;
+        """)
+
+        conn.commit()
+
+def rebuild_game_stats(conn):
+    """依現有的 Review / PlayRecord 重新計算 GameStats (第一次建立統計表時使用)"""
+    conn.execute("DELETE FROM GameStats")
+    conn.execute("""
+    INSERT INTO GameStats (game_name, review_count, rating_sum, star1, star2, star3, star4, star5)
+    SELECT game_name, COUNT(*), SUM(rating),
+           SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+    FROM Review GROUP BY game_name
+    """)
+    conn.execute("""
+    INSERT INTO GameStats (game_name, play_count)
+    SELECT game_name, SUM(play_count) FROM PlayRecord GROUP BY game_name
+    ON CONFLICT (game_name) DO UPDATE SET play_count = excluded.play_count
+    """)
+
+def migrate_play_record(conn):
+    """舊版 PlayRecord 每玩一次新增一列；合併成每個 (玩家, 遊戲) 一列的計數"""
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(PlayRecord)")]
+    if not cols or "play_count" in cols: return
 
+    print("[DB] migrating PlayRecord ...")
+    if conn.in_transaction: conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("ALTER TABLE PlayRecord RENAME TO PlayRecord_old")
+        conn.execute("""
+        CREATE TABLE PlayRecord (
+            username TEXT NOT NULL,
+            game_name TEXT NOT NULL,
+            play_count INTEGER NOT NULL DEFAULT 1,
+            play_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, game_name)
+        ) WITHOUT ROWID;
+        """)
+        conn.execute("""
+        INSERT INTO PlayRecord (username, game_name, play_count, play_time)
+        SELECT username, game_name, COUNT(*), MAX(play_time)
+        FROM PlayRecord_old GROUP BY username, game_name
+        """)
+        conn.execute("DROP TABLE PlayRecord_old")
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print("[DB] PlayRecord migrated")
+
+def open_conn(readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, cached_statements=STMT_CACHE)
+    else:
+        conn = sqlite3.connect(DB_PATH, cached_statements=STMT_CACHE)
+    conn.row_factory = sqlite3.Row
+    #連線層級的設定，每條連線開啟時設定一次
+    conn.execute("PRAGMA busy_timeout=5000;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA foreign_keys=ON;")
+    conn.execute("PRAGMA mmap_size=268435456;") #256MB
+    conn.execute("PRAGMA cache_size=-16000;")   #16MB
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    return conn
+
+def get_conn(readonly=False):
+    attr = "ro" if readonly else "rw"
+    conn = getattr(_local, attr, None)
+    if conn is None:
+        conn = open_conn(readonly)
+        setattr(_local, attr, conn)
+    return conn
+
+def game_stats(row):
+    if row is None:
+        return {"review_count": 0, "rating_sum": 0, "avg_rating": 0, "histogram": [0] * 5, "play_count": 0}
+    count = row["review_count"]
+    return {
+        "review_count": count,
+        "rating_sum": row["rating_sum"],
+        "avg_rating": row["rating_sum"] / count if count else 0,
+        "histogram": [row["star1"], row["star2"], row["star3"], row["star4"], row["star5"]], # 1~5 星各幾則
+        "play_count": row["play_count"],
+    }
 
 def ok(data):
     return {"ok": True, "data": data}
@@ -66,9 +220,8 @@ def db_request(req: dict) -> dict:
     op = req.get("op")
     if not op: return err("no_op", "missing 'op'")
 
-    #每次處理請求時才建立連線
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    #沿用這個執行緒的連線，不必每次重新開檔
+    conn = get_conn(readonly=op in READ_OPS)
     cur = conn.cursor()
 
     try:
@@ -160,8 +313,11 @@ def db_request(req: dict) -> dict:
             return ok({"user": user})
         
         elif op == "add_play_record":
-            cur.execute("INSERT INTO PlayRecord (username, game_name) VALUES (?, ?)", 
-                       (req['username'], req['game_name']))
+            cur.execute("""
+                INSERT INTO PlayRecord (username, game_name) VALUES (?, ?)
+                ON CONFLICT (username, game_name)
+                DO UPDATE SET play_count = play_count + 1, play_time = CURRENT_TIMESTAMP
+                """, (req['username'], req['game_name']))
             conn.commit()
             return ok({})
 
@@ -177,41 +333,68 @@ def db_request(req: dict) -> dict:
             return ok({})
 
         elif op == "get_game_reviews":
-            cur.execute("SELECT username, version, rating, comment FROM Review WHERE game_name = ?", (req['game_name'],))
+            cur.execute("SELECT username, version, rating, comment FROM Review WHERE game_name = ? ORDER BY review_time", (req['game_name'],))
             reviews = [dict(row) for row in cur.fetchall()]
             return ok({"reviews": reviews})
 
+        #一次查多款遊戲的統計，沒有紀錄的遊戲回傳全 0
+        elif op == "get_game_stats":
+            names = req.get("game_names") or []
+            stats = {}
+            for i in range(0, len(names), 500):
+                chunk = names[i:i + 500]
+                cur.execute(f"SELECT * FROM GameStats WHERE game_name IN ({','.join('?' * len(chunk))})", chunk)
+                for row in cur.fetchall():
+                    stats[row["game_name"]] = game_stats(row)
+            return ok({"stats": {name: stats.get(name) or game_stats(None) for name in names}})
+
         else:
             return err("unknown_op", f"unknown op '{op}'")
     finally:
-        conn.close()
+        cur.close()
+        #連線會留給下一個請求，中途出錯沒 commit 的交易要還原
+        if conn.in_transaction: conn.rollback()
+
+def db_serve(db_sock, raw):
+    req_id = raw.pop("req_id", None)
+    try:
+        resp = db_request(raw)
+    except Exception as e:
+        resp = err("db_exception", str(e))
+    if req_id is not None: resp["req_id"] = req_id
+    send_json(db_sock, resp)
 
 def db_loop(db_sock):
+    #帶 req_id 的請求交給 worker 同時處理，回覆順序不限 (Lobby 依 req_id 對應)
+    pool = ThreadPoolExecutor(max_workers=DB_WORKERS)
     while True:
         raw = recv_json(db_sock)
         if raw is None: break
-        try:
-            resp = db_request(raw)
-        except Exception as e:
-            resp = err("db_exception", str(e))
+        if "req_id" in raw:
+            pool.submit(db_serve, db_sock, raw)
+        else:
+            db_serve(db_sock, raw) #舊版 Lobby 沒有 req_id，只能照順序回覆
+    pool.shutdown()
+
+def main(server=SERVER, port=PORT):
+    DB = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    DB.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        DB.connect((server,port))
+        # 【新增】連線成功時的顯示
+        print(f"[DB] connect server success at {server}:{port}")
+        
+        send_hello(DB, "DB")    
+        init_db()
+        db_loop(DB)  
 
-        send_json(db_sock, resp)
+    except ConnectionRefusedError:
+        print(f"[ERROR] Failed to connect to server at {server}:{port}. Connection refused.")
+    except socket.gaierror:
+        print(f"[ERROR] Address resolution failed for {server}:{port}. Check the server IP.")
+    except Exception as e:
+        print(f"[ERROR] An unexpected error occurred during connection: {e}")
 
 #TCP
-DB = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-DB.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-try:
-    DB.connect((SERVER,PORT))
-    # 【新增】連線成功時的顯示
-    print(f"[DB] connect server success at {SERVER}:{PORT}")
-    
-    send_text(DB, "DB")    
-    init_db()
-    db_loop(DB)  
-
-except ConnectionRefusedError:
-    print(f"[ERROR] Failed to connect to server at {SERVER}:{PORT}. Connection refused.")
-except socket.gaierror:
-    print(f"[ERROR] Address resolution failed for {SERVER}:{PORT}. Check the server IP.")
-except Exception as e:
-    print(f"[ERROR] An unexpected error occurred during connection: {e}")
+if __name__ == "__main__":
+    main()
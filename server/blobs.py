@@ -0,0 +1,165 @@
+import os
+import uuid
+import shutil
+import hashlib
+import threading
+from common import recv_file, file_sha256, compress_file, decompress_file, make_delta, ZLIB_SUFFIX
+
+class BlobStore:
+    """
+    以內容 SHA-256 命名的遊戲檔案庫：games_repo/blobs/<sha256>.py (+ 壓縮版 .py.zz)。
+    內容相同的檔案 (不同遊戲或不同版本) 只存一份。
+
+    參考計數 = 引用它的遊戲數 (track) + 暫時釘住它的次數 (pin，上傳中/下載中)，
+    歸零時才刪檔，所以更新遊戲時舊版本在傳送中也不會被刪掉。
+
+    另外快取版本之間的差異檔 games_repo/deltas/<舊 sha256>-<新 sha256>.delta，
+    任一端的 blob 被刪除時一起刪掉。
+    """
+    def __init__(self, root):
+        self.dir = os.path.join(root, 'blobs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.delta_dir = os.path.join(root, 'deltas')
+        for d in (self.dir, self.tmp_dir, self.delta_dir):
+            os.makedirs(d, exist_ok=True)
+        self.lock = threading.Lock()
+        self.delta_lock = threading.Lock() # 同一時間只算一個差異檔 (避免多人同時要同一個時重複計算)
+        self.refs = {}   # sha256 -> 參考計數 (只有存在磁碟上的 blob 才會出現)
+        self.games = {}  # 遊戲名稱 -> 它的版本清單引用到的 sha256 集合
+        self.deltas = {} # (舊 sha256, 新 sha256) -> 差異檔路徑；None 表示差異檔不比完整檔小
+
+    def path(self, sha256):
+        return os.path.join(self.dir, sha256 + '.py')
+
+    def receive(self, conn, encoding=None):
+        """
+        接收上傳的遊戲檔，邊收邊算 SHA-256，收完才放進 blobs (同內容已存在就直接沿用)。
+        encoding='zlib' 表示對方傳來的是壓縮檔，直接留用當下載用的壓縮版。
+        成功回傳 sha256 (已 pin，呼叫端更新完版本清單後要 release)，失敗回傳 None。
+        """
+        tmp = os.path.join(self.tmp_dir, uuid.uuid4().hex + '.py')
+        ztmp = tmp + ZLIB_SUFFIX
+        digest = hashlib.sha256()
+        try:
+            if encoding == 'zlib':
+                if not recv_file(conn, ztmp): return None
+                decompress_file(ztmp, tmp, hasher=digest)
+            else:
+                if not recv_file(conn, tmp, hasher=digest): return None
+            sha256 = digest.hexdigest()
+            if self.pin(sha256): return sha256 # 已經有同內容的檔案
+            if encoding != 'zlib':
+                compress_file(tmp, ztmp)
+            self._publish(sha256, tmp, ztmp)
+            return sha256
+        except Exception as e:
+            print(f"[ERROR] 處理遊戲檔案失敗: {e}")
+            return None
+        finally:
+            for path in (tmp, ztmp):
+                if os.path.exists(path): os.remove(path)
+
+    def delta(self, old, new):
+        """
+        舊版 -> 新版的差異檔路徑 (第一次要時計算並快取)；差異檔不比壓縮後的完整檔小時回傳 None。
+        呼叫端要先 pin 住兩個 blob。
+        """
+        key = (old, new)
+        with self.delta_lock:
+            if key in self.deltas: return self.deltas[key]
+            path = os.path.join(self.delta_dir, f"{old}-{new}.delta")
+            tmp = os.path.join(self.tmp_dir, uuid.uuid4().hex + '.delta')
+            try:
+                size = make_delta(self.path(old), self.path(new), tmp)
+                if size < os.path.getsize(self.path(new) + ZLIB_SUFFIX):
+                    os.replace(tmp, path)
+                else:
+                    path = None
+            except Exception as e:
+                print(f"[ERROR] 產生差異檔失敗 {old[:12]} -> {new[:12]}: {e}")
+                return None
+            finally:
+                if os.path.exists(tmp): os.remove(tmp)
+            self.deltas[key] = path
+            return path
+
+    def import_file(self, src):
+        """把舊版 games_repo/<name>.py 複製進 blobs (啟動時轉換舊資料用)，回傳已 pin 的 sha256"""
+        sha256 = file_sha256(src).hexdigest()
+        if self.pin(sha256): return sha256
+        tmp = os.path.join(self.tmp_dir, uuid.uuid4().hex + '.py')
+        ztmp = tmp + ZLIB_SUFFIX
+        shutil.copyfile(src, tmp)
+        compress_file(tmp, ztmp)
+        self._publish(sha256, tmp, ztmp)
+        return sha256
+
+    def _publish(self, sha256, tmp, ztmp):
+        # 先放壓縮版再放本體：本體存在就代表兩個都完整
+        with self.lock:
+            if sha256 in self.refs:
+                self.refs[sha256] += 1
+                return
+            path = self.path(sha256)
+            os.replace(ztmp, path + ZLIB_SUFFIX)
+            os.replace(tmp, path)
+            self.refs[sha256] = 1
+
+    def pin(self, sha256):
+        """暫時持有一個 blob；它已經不存在時回傳 False"""
+        with self.lock:
+            if sha256 not in self.refs: return False
+            self.refs[sha256] += 1
+            return True
+
+    def release(self, sha256):
+        with self.lock:
+            self._release(sha256)
+
+    def _release(self, sha256):
+        self.refs[sha256] -= 1
+        if self.refs[sha256] == 0:
+            del self.refs[sha256]
+            path = self.path(sha256)
+            stale = [path, path + ZLIB_SUFFIX]
+            for key in [key for key in list(self.deltas) if sha256 in key]:
+                delta = self.deltas.pop(key, None)
+                if delta: stale.append(delta)
+            for p in stale:
+                try:
+                    os.remove(p)
+                except OSError as e:
+                    print(f"[ERROR] 刪除遊戲檔案失敗 {p}: {e}")
+
+    def track(self, name, shas):
+        """更新某款遊戲引用的 blob 集合 (版本清單變動或下架時)，不再被引用的 blob 會被刪除"""
+        new = set(shas)
+        with self.lock:
+            old = self.games.pop(name, set())
+            if new: self.games[name] = new
+            for sha256 in new - old:
+                if sha256 not in self.refs:
+                    if not os.path.exists(self.path(sha256)):
+                        print(f"[ERROR] 遊戲 {name} 的檔案 {sha256[:12]} 不存在")
+                        continue
+                    self.refs[sha256] = 0
+                self.refs[sha256] += 1
+            for sha256 in old - new:
+                if sha256 in self.refs: self._release(sha256)
+
+    def collect(self):
+        """啟動時清掉沒人引用的 blob / 差異檔與上傳到一半的暫存檔 (上次當機留下的)，並載入還能用的差異檔"""
+        removed = 0
+        with self.lock:
+            for d in (self.dir, self.tmp_dir, self.delta_dir):
+                for fname in os.listdir(d):
+                    path = os.path.join(d, fname)
+                    if d == self.dir and fname.split('.', 1)[0] in self.refs: continue
+                    if d == self.delta_dir and fname.endswith('.delta'):
+                        key = tuple(fname[:-len('.delta')].split('-'))
+                        if len(key) == 2 and all(sha256 in self.refs for sha256 in key):
+                            self.deltas[key] = path
+                            continue
+                    os.remove(path)
+                    removed += 1
+        if removed: print(f"[CLEAN] 已清除 {removed} 個未使用的遊戲檔案")
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import socket
+import asyncio
+import importlib.util
+from game_worker import limit_memory
+from game_sdk import RESYNC, encode_line
+
+#在一個行程、一個 event loop 裡同時跑很多局同一款遊戲 (遊戲模組只用 importlib 載入一次)
+#python game_host.py <reply_fd> <記憶體上限 MB> <每局時間上限 (秒)> <遊戲腳本>
+#
+#遊戲模組要提供 GameSession 類別 (沒有的話是舊式 run_server 遊戲，大廳改用獨立行程)，
+#通常繼承 game_sdk.py 的 GameServer (見 developer/template.py)；這裡的 Session 提供與 game_sdk.LocalSession 相同的介面：
+#    class GameSession:
+#        player_count = 2                         # 湊滿幾人開始
+#        def __init__(self, session): ...         # session 提供 players / send / broadcast / end / set_timer
+#        def on_join(self, player): ...           # 玩家連上 (player.index 從 0 起，player.role 是 'P1'...)
+#        def on_message(self, player, line): ...  # 收到玩家的一行訊息 (已去掉換行)
+#        def on_leave(self, player): ...          # 玩家斷線；沒定義的話直接結束這局
+#        def on_resync(self, player): ...         # 玩家送出一行 SYNC (game_sdk.RESYNC，要求完整狀態)；沒定義的話當一般訊息
+#
+#大廳從 stdin 送指令 (一行一個 JSON)，回覆寫到 reply_fd：
+#  啟動後        -> {"event": "ready", "hosted": true/false}
+#  {"op": "new_match", "id": n} -> {"id": n, "port": p}   (每局一個 listen socket，port 0 由系統挑選)
+#  一局結束時    -> {"event": "finished", "id": n}
+
+class Player:
+    def __init__(self, index, writer):
+        self.index = index
+        self.role = f'P{index + 1}'
+        self.writer = writer
+
+class Session:
+    """一局遊戲：管理這局的 listen socket 與玩家連線，提供遊戲使用的 send / broadcast / end"""
+    def __init__(self, host, match_id):
+        self.host = host
+        self.match_id = match_id
+        self.players = []
+        self.server = None
+        self.ended = False
+        self.game = host.game_cls(self)
+        self.player_count = getattr(self.game, 'player_count', 2)
+        self.timer = asyncio.get_running_loop().call_later(host.time_limit, self.end)
+
+    async def listen(self):
+        self.server = await asyncio.start_server(self.handle, '0.0.0.0', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    def send(self, player, msg):
+        if not player.writer.is_closing():
+            player.writer.write(encode_line(msg))
+
+    def broadcast(self, msg):
+        data = encode_line(msg) # 只編碼一次
+        for player in self.players:
+            if not player.writer.is_closing():
+                player.writer.write(data)
+
+    def end(self):
+        """結束這局：關閉所有連線並通知大廳 (可重複呼叫)"""
+        if self.ended: return
+        self.ended = True
+        self.timer.cancel()
+        if self.server: self.server.close()
+        for player in self.players:
+            player.writer.close()
+        self.host.finished(self.match_id)
+
+    def set_timer(self, seconds, callback):
+        """seconds 秒後呼叫 callback (回傳的 handle 可以 cancel())；這局結束後不再觸發"""
+        return asyncio.get_running_loop().call_later(seconds, self._fire, callback)
+
+    def _fire(self, callback):
+        if not self.ended: self._run(callback)
+
+    def _call(self, hook, *args):
+        self._run(getattr(self.game, hook), *args)
+
+    def _run(self, func, *args):
+        """呼叫遊戲的程式；遊戲出錯只結束這一局，不影響同一行程裡的其他局"""
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"[GAME HOST] match {self.match_id} {getattr(func, '__name__', func)} error: {e}")
+            self.end()
+
+    async def handle(self, reader, writer):
+        if self.ended or len(self.players) >= self.player_count:
+            writer.close()
+            return
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        player = Player(len(self.players), writer)
+        self.players.append(player)
+        if len(self.players) == self.player_count:
+            self.server.close() # 人數到齊，不再接受連線
+        if hasattr(self.game, 'on_join'): self._call('on_join', player)
+        try:
+            while not self.ended:
+                line = await reader.readline()
+                if not line: break
+                line = line.decode('utf-8', 'replace').strip()
+                if line == RESYNC and hasattr(self.game, 'on_resync'): self._call('on_resync', player)
+                else: self._call('on_message', player, line)
+        except ConnectionError:
+            pass
+        if not self.ended:
+            if hasattr(self.game, 'on_leave'):
+                self._call('on_leave', player)
+            else:
+                self.end()
+
+class GameHost:
+    def __init__(self, game_cls, reply_fd, time_limit):
+        self.game_cls = game_cls
+        self.reply_fd = reply_fd
+        self.time_limit = time_limit
+        self.sessions = {}
+
+    def reply(self, msg):
+        os.write(self.reply_fd, encode_line(msg))
+
+    def finished(self, match_id):
+        if self.sessions.pop(match_id, None) is not None:
+            self.reply({'event': 'finished', 'id': match_id})
+
+    async def new_match(self, match_id):
+        session = None
+        try:
+            # 遊戲的 __init__ 出錯也只讓這一局開不成，不影響其他局
+            session = Session(self, match_id)
+            self.sessions[match_id] = session
+            port = await session.listen()
+        except Exception as e:
+            print(f"[GAME HOST] match {match_id} start failed: {e}")
+            self.sessions.pop(match_id, None)
+            if session is not None:
+                session.timer.cancel()
+                if session.server: session.server.close()
+            port = None
+        self.reply({'id': match_id, 'port': port})
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        while True:
+            line = await reader.readline()
+            if not line: break # 大廳關閉了 stdin (或大廳結束)
+            cmd = json.loads(line)
+            if cmd.get('op') == 'new_match':
+                await self.new_match(cmd['id'])
+
+def load_game(script):
+    """以 importlib 載入遊戲腳本 (不會執行它的 __main__ 區塊)"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    spec = importlib.util.spec_from_file_location('hosted_game', script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def raise_fd_limit():
+    """每局佔 1 個 listen socket + 每位玩家 1 條連線，把可開檔案數調到上限"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def main():
+    reply_fd = int(sys.argv[1])
+    memory_limit = int(sys.argv[2])
+    time_limit = float(sys.argv[3])
+    script = sys.argv[4]
+    if memory_limit: limit_memory(memory_limit)
+    game_cls = getattr(load_game(script), 'GameSession', None)
+    host = GameHost(game_cls, reply_fd, time_limit)
+    host.reply({'event': 'ready', 'hosted': game_cls is not None})
+    if game_cls is None: return
+    raise_fd_limit()
+    asyncio.run(host.serve())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import select
+import threading
+import subprocess
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_worker.py')
+HOST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'game_host.py')
+POOL_SIZE = 1             # 每款最近有人玩的遊戲預先準備幾個 worker
+WORKER_IDLE_TIMEOUT = 300 # 閒置的 worker 超過這麼多秒沒被用到就關掉
+READY_TIMEOUT = 10        # 等待 worker 開始 listen 的秒數
+MAX_LIVE_SESSIONS = 200   # 同時進行中的遊戲上限
+SESSION_TIME_LIMIT = 2 * 60 * 60 # 每局遊戲最長執行秒數，超過就結束行程
+SESSION_MEMORY_LIMIT = 512       # 每個遊戲 Server 的記憶體上限 (MB，位址空間)
+HOST_MEMORY_LIMIT = 2048         # game host (一個行程跑很多局) 的記憶體上限 (MB)
+MAX_HOSTED_SESSIONS = 2000       # 一個 game host 同時進行的局數上限
+REAP_INTERVAL = 1
+
+class Worker:
+    def __init__(self, script, args):
+        self.script = script
+        self.port = None      # listen 之後由 worker 回報 (bind 在 port 0，由系統挑選)
+        read_fd, write_fd = os.pipe()
+        self.proc = subprocess.Popen([sys.executable, WORKER_SCRIPT, str(write_fd), str(SESSION_MEMORY_LIMIT),
+                                      script, 'server', '0', *args],
+                                     pass_fds=(write_fd,))
+        os.close(write_fd)
+        self.ready_fd = read_fd
+        self.ready = None     # None: 還在啟動；True: 已在 listen；False: 啟動失敗
+        self.idle_since = time.monotonic()
+        self.started = None   # 交給房間的時間
+
+    def wait_ready(self, timeout):
+        """等 worker 回報 listen 完成 (或結束/逾時)，回傳是否可以用"""
+        if self.ready is None:
+            readable, _, _ = select.select([self.ready_fd], [], [], timeout)
+            line = os.read(self.ready_fd, 64).split() if readable else []
+            self.ready = len(line) == 2 and line[0] == b'ready'
+            if self.ready: self.port = int(line[1])
+            self.close_pipe()
+            if not self.ready: self.kill()
+        return self.ready and self.proc.poll() is None
+
+    def close_pipe(self):
+        if self.ready_fd is not None:
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+    def kill(self):
+        self.close_pipe()
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+class HostedMatch:
+    """在 game host 裡進行的一局 (對房間來說跟 Worker 一樣只需要 port)"""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+class GameHost:
+    """
+    大廳這端的 game host：一個行程 (game_host.py) 載入遊戲模組一次，在同一個 event loop 裡跑很多局。
+    指令從 stdin 送出，回覆由一條執行緒讀取後依 id 交給等待中的執行緒 (與 DBClient 相同的做法)。
+    """
+    def __init__(self, script):
+        self.script = script
+        read_fd, write_fd = os.pipe()
+        self.proc = subprocess.Popen([sys.executable, HOST_SCRIPT, str(write_fd), str(HOST_MEMORY_LIMIT),
+                                      str(SESSION_TIME_LIMIT), script],
+                                     stdin=subprocess.PIPE, pass_fds=(write_fd,))
+        os.close(write_fd)
+        self.replies = os.fdopen(read_fd, 'rb')
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.hosted = False     # 遊戲有 GameSession 才能由 host 執行
+        self.next_id = 1
+        self.pending = {}       # match id -> [Event, port]
+        self.live = 0
+        self.finished = 0
+        self.idle_since = time.monotonic()
+        threading.Thread(target=self._demux, daemon=True).start()
+
+    def _demux(self):
+        for line in self.replies:
+            msg = json.loads(line)
+            if msg.get('event') == 'ready':
+                self.hosted = msg['hosted']
+                self.ready.set()
+            elif msg.get('event') == 'finished':
+                with self.lock:
+                    self.live -= 1
+                    self.finished += 1
+                    if self.live == 0: self.idle_since = time.monotonic()
+            else:
+                with self.lock:
+                    slot = self.pending.pop(msg['id'], None)
+                if slot is None: continue
+                slot[1] = msg['port']
+                slot[0].set()
+        # host 結束了 (或載入遊戲失敗)
+        self.replies.close()
+        self.ready.set()
+        with self.lock:
+            waiting, self.pending = self.pending, {}
+        for slot in waiting.values(): slot[0].set()
+        self.proc.wait()
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def new_match(self):
+        """開一局，回傳 HostedMatch；host 已結束、局數已滿或逾時回傳 None"""
+        slot = [threading.Event(), None]
+        with self.lock:
+            if not self.alive() or self.live >= MAX_HOSTED_SESSIONS: return None
+            match_id = self.next_id
+            self.next_id += 1
+            self.pending[match_id] = slot
+            self.live += 1
+            try:
+                self.proc.stdin.write(json.dumps({'op': 'new_match', 'id': match_id}).encode() + b"\n")
+                self.proc.stdin.flush()
+            except OSError:
+                slot[0].set()
+        if not slot[0].wait(READY_TIMEOUT) or slot[1] is None:
+            with self.lock:
+                self.pending.pop(match_id, None)
+                self.live -= 1
+            return None
+        return HostedMatch(self, slot[1])
+
+    def stop(self):
+        # 關閉 stdin 後 host 會自行結束；進行中的局交給時間上限處理，這裡只在閒置時呼叫
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+
+class WorkerPool:
+    """
+    遊戲 Server 的 worker 池兼監督者：
+    - 每款遊戲 (以遊戲腳本路徑區分，換版本就是另一個 key) 預先啟動 POOL_SIZE 個已經在 listen 的 worker，
+      房間湊滿時直接取一個可用的 worker，取走後再補一個；閒置太久的 worker 會被關掉。
+    - worker 以 port 0 listen 並回報實際的 port，不會用完或撞到 port。
+    - 背景執行緒回收結束的行程 (不留殭屍行程)，並結束超過時間上限的遊戲；記憶體上限由 worker 自己設定。
+    - 遊戲提供 GameSession (事件介面，見 game_host.py) 時，改由 game host 在同一個行程裡跑所有局，
+      每局不必再啟動一個 Python；舊式只有 run_server 的遊戲照樣用獨立行程。
+      每款遊戲第一次使用時先啟動 game host，由它回報能否代管。
+    - stats() 回傳進行中 / 閒置 / 已結束的數量。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}     # 遊戲腳本 -> GameHost (舊式遊戲是已結束、hosted=False 的紀錄)
+        self.idle = {}      # 遊戲腳本 -> [Worker] (閒置中，可能還在啟動)
+        self.running = []   # 已交給房間、進行中的 worker
+        self.warming = set() # 正在等 game host 回報、之後要補 worker 的遊戲腳本
+        self.finished = 0   # 已結束的遊戲數
+        self.killed = 0     # 其中因超過時間上限被結束的數量
+        threading.Thread(target=self._reaper, daemon=True).start()
+
+    def _host(self, script):
+        """這款遊戲的 game host (沒有或已當掉就啟動一個)"""
+        with self.lock:
+            host = self.hosts.get(script)
+            if host is None or (host.hosted and not host.alive()):
+                host = self.hosts[script] = GameHost(script)
+            return host
+
+    def warm(self, script, args=()):
+        """
+        先準備好這款遊戲的 game host；舊式遊戲則確保有 POOL_SIZE 個閒置 worker
+        (只啟動行程，不等它 listen，不會卡住呼叫端)
+        """
+        host = self._host(script)
+        if host.ready.is_set():
+            self._fill_idle(host, script, args)
+            return
+        # 第一次開房時 host 還沒回報能否代管：由背景執行緒等它回報後再補 worker，第一局也不必當場啟動
+        with self.lock:
+            if script in self.warming: return
+            self.warming.add(script)
+        def wait_and_fill():
+            host.ready.wait(READY_TIMEOUT)
+            with self.lock:
+                self.warming.discard(script)
+            self._fill_idle(host, script, args)
+        threading.Thread(target=wait_and_fill, daemon=True).start()
+
+    def _fill_idle(self, host, script, args):
+        """舊式遊戲 (host 已回報無法代管) 補足 POOL_SIZE 個閒置 worker"""
+        if not host.ready.is_set() or host.hosted: return
+        with self.lock:
+            slots = self.idle.setdefault(script, [])
+            while len(slots) < POOL_SIZE:
+                slots.append(Worker(script, args))
+
+    def acquire(self, script, args=()):
+        """
+        取一個已在 listen 的 worker 給房間使用 (預先啟動的還沒好就等它，都不能用就當場啟動)。
+        可由 game host 代管的遊戲回傳 HostedMatch。進行中的遊戲已達上限或啟動失敗時回傳 None。
+        """
+        host = self._host(script)
+        host.ready.wait(READY_TIMEOUT)
+        if host.hosted:
+            match = host.new_match()
+            if match is None and not host.alive(): # host 剛好當掉：重開一次
+                host = self._host(script)
+                host.ready.wait(READY_TIMEOUT)
+                match = host.new_match() if host.hosted else None
+            if match is None: print(f"[POOL] {os.path.basename(script)} 無法開始新的一局")
+            return match
+        with self.lock:
+            if len(self.running) >= MAX_LIVE_SESSIONS: return None
+        worker = None
+        while worker is None:
+            with self.lock:
+                slots = self.idle.get(script)
+                if not slots: break
+                candidate = slots.pop(0)
+            if candidate.wait_ready(READY_TIMEOUT): worker = candidate
+        if worker is None:
+            worker = Worker(script, args)
+            if not worker.wait_ready(READY_TIMEOUT):
+                print(f"[POOL] {os.path.basename(script)} 啟動失敗")
+                return None
+        self.warm(script, args)
+        worker.started = time.monotonic()
+        with self.lock:
+            self.running.append(worker)
+        return worker
+
+    def stats(self):
+        with self.lock:
+            hosts = [host for host in self.hosts.values() if host.hosted]
+            return {'live': len(self.running) + sum(host.live for host in hosts),
+                    'idle': sum(len(slots) for slots in self.idle.values()),
+                    'finished': self.finished + sum(host.finished for host in hosts),
+                    'killed': self.killed, 'hosts': sum(1 for host in hosts if host.alive())}
+
+    def _reaper(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            expired = []
+            with self.lock:
+                for script, slots in list(self.idle.items()):
+                    for w in list(slots):
+                        if w.proc.poll() is not None or now - w.idle_since > WORKER_IDLE_TIMEOUT:
+                            slots.remove(w)
+                            expired.append(w)
+                    if not slots: del self.idle[script]
+                for script, host in list(self.hosts.items()):
+                    idle_too_long = host.live == 0 and now - host.idle_since > WORKER_IDLE_TIMEOUT
+                    if host.hosted and (idle_too_long or not host.alive()):
+                        # 閒置太久的 game host 關掉；當掉的移除 (當時進行中的局也算結束)
+                        del self.hosts[script]
+                        host.stop()
+                        self.finished += host.finished + host.live
+                    elif not host.hosted and host.ready.is_set() and idle_too_long:
+                        del self.hosts[script] # 舊式遊戲的紀錄
+                running = []
+                for w in self.running:
+                    if w.proc.poll() is not None: # poll() 會回收已結束的行程
+                        self.finished += 1
+                    elif now - w.started > SESSION_TIME_LIMIT:
+                        print(f"[POOL] port {w.port} 的遊戲超過 {SESSION_TIME_LIMIT} 秒，強制結束")
+                        expired.append(w)
+                        self.finished += 1
+                        self.killed += 1
+                    else:
+                        running.append(w)
+                self.running = running
+            for w in expired:
+                w.kill()
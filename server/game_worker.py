@@ -0,0 +1,43 @@
+import os
+import sys
+import socket
+import runpy
+
+#預先啟動的遊戲 Server 行程：python game_worker.py <ready_fd> <記憶體上限 MB> <遊戲腳本> server 0 [其他參數]
+#先載入遊戲腳本 (import 等啟動成本在房間湊滿之前就付完)。遊戲以 port 0 bind，由系統挑一個空的 port，
+#呼叫 listen() 之後立刻在 ready_fd (大廳建立的 pipe) 寫一行 "ready <實際 port>"，大廳收到才通知玩家連線
+
+def limit_memory(megabytes):
+    """限制位址空間大小，超過時遊戲的配置會失敗 (MemoryError) 而不會拖垮整台機器；非 POSIX 系統略過"""
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def main():
+    ready_fd = int(sys.argv[1])
+    memory_limit = int(sys.argv[2])
+    script = sys.argv[3]
+    listen = socket.socket.listen
+
+    def listen_and_notify(self, *args):
+        listen(self, *args)
+        nonlocal ready_fd
+        if ready_fd is not None:
+            try:
+                os.write(ready_fd, f"ready {self.getsockname()[1]}\n".encode())
+                os.close(ready_fd)
+            except OSError:
+                pass
+            ready_fd = None
+
+    if memory_limit: limit_memory(memory_limit)
+    socket.socket.listen = listen_and_notify
+    sys.argv = [script] + sys.argv[4:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    runpy.run_path(script, run_name='__main__')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import threading
+import bisect
+import heapq
+import itertools
+import unicodedata
+
+#search_games 使用的記憶體內搜尋索引 (遊戲名稱 + 簡介)
+#以「字元」切兩字組 (bigram)，不需要斷詞，中文、英文、混合都適用 (中文檢索常用的切法)
+
+PAD = '\0'       #文字尾端補一個，讓最後一個字也有自己的 bigram (查單一字時用)
+SORT_LIMIT = 512 #結果在這個數量以內直接排序取前幾筆
+
+def normalize(text):
+    """全形轉半形、英文不分大小寫"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+def bigrams(text):
+    padded = text + PAD
+    return {padded[i:i + 2] for i in range(len(text))}
+
+class SearchIndex:
+    """
+    倒排索引：bigram -> 含有它的遊戲名稱集合。
+    查一個字：以它開頭的 bigram 聯集；兩個字：直接查表；
+    三個字以上：各 bigram 交集後，再確認整個詞真的連續出現。
+    上架/更新/下架時只增刪該遊戲的 bigram，不必重建。結果依遊戲名稱排序。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.texts = {}     # 遊戲名稱 -> 正規化後的 "名稱\n簡介"
+        self.postings = {}  # bigram -> {遊戲名稱}
+        self.prefix1 = {}   # 單一字 -> {以它開頭的 bigram}
+        self.names = []     # 所有遊戲名稱 (排序好)
+
+    def add(self, name, desc):
+        """新增或更新一款遊戲"""
+        with self.lock:
+            if name not in self.texts:
+                bisect.insort(self.names, name)
+            self._index(name, desc)
+
+    def add_many(self, items):
+        """一次加入多款遊戲 (啟動時建立索引用)，最後才排序一次"""
+        with self.lock:
+            for name, desc in items:
+                self._index(name, desc)
+            self.names = sorted(self.texts)
+
+    def remove(self, name):
+        with self.lock:
+            if name not in self.texts: return
+            self._unindex(name)
+            del self.names[bisect.bisect_left(self.names, name)]
+
+    def _index(self, name, desc):
+        text = normalize(name) + '\n' + normalize(desc)
+        if self.texts.get(name) == text: return
+        self._unindex(name)
+        self.texts[name] = text
+        for gram in bigrams(text):
+            names = self.postings.get(gram)
+            if names is None:
+                names = self.postings[gram] = set()
+                self.prefix1.setdefault(gram[0], set()).add(gram)
+            names.add(name)
+
+    def _unindex(self, name):
+        text = self.texts.pop(name, None)
+        if text is None: return
+        for gram in bigrams(text):
+            names = self.postings[gram]
+            names.discard(name)
+            if not names:
+                del self.postings[gram]
+                grams = self.prefix1[gram[0]]
+                grams.discard(gram)
+                if not grams: del self.prefix1[gram[0]]
+
+    def _match(self, term):
+        """含有 term 的遊戲名稱集合 (可能直接回傳索引裡的集合，呼叫端不可修改)"""
+        if len(term) == 1:
+            return set().union(*(self.postings[gram] for gram in self.prefix1.get(term, ())))
+        sets = []
+        for gram in {term[i:i + 2] for i in range(len(term) - 1)}:
+            names = self.postings.get(gram)
+            if not names: return set()
+            sets.append(names)
+        if len(term) == 2: return sets[0]
+        sets.sort(key=len)
+        result = sets[0].intersection(*sets[1:])
+        texts = self.texts
+        return {name for name in result if term in texts[name]}
+
+    def _first(self, names, count):
+        """依名稱順序取出 names 中的前 count 個"""
+        if count <= 0 or not names: return []
+        if len(names) > SORT_LIMIT:
+            # 結果多時從排序好的名稱依序掃，平均掃 count * 總數 / 結果數 個就湊滿；
+            # 結果集中在某一段 (例如名稱前綴相同) 掃太久時才改用排序
+            page = []
+            budget = 4 * count * len(self.names) // len(names) + 1000
+            for name in itertools.islice(self.names, budget):
+                if name in names:
+                    page.append(name)
+                    if len(page) == count: return page
+        return heapq.nsmallest(count, names)
+
+    def search(self, query, offset=0, limit=20):
+        """
+        以空白分隔的多個詞都要出現 (AND)。
+        回傳 (符合總數, 第 offset 筆起最多 limit 筆的遊戲名稱 list)。
+        """
+        terms = sorted(set(normalize(query).split()), key=len, reverse=True)
+        if not terms: return 0, []
+        with self.lock:
+            # 先查最長的詞 (通常結果最少)，剩下的詞在結果不多時直接比對字串
+            result = self._match(terms[0])
+            for term in terms[1:]:
+                if not result: break
+                if len(result) <= 64:
+                    texts = self.texts
+                    result = {name for name in result if term in texts[name]}
+                else:
+                    result = result & self._match(term)
+            page = self._first(result, offset + limit)
+        return len(result), page[offset:]
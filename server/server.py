@@ -1,13 +1,16 @@
 import socket
 import threading
 import os
-import subprocess
 import sys
 import time
-import json
-from common import send_json, recv_json, recv_file, send_file, recv_text
-
-db_lock = threading.Lock()
+import asyncio
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from search import SearchIndex
+from store import CatalogStore
+from blobs import BlobStore
+from game_pool import WorkerPool
+from common import send_json, recv_json, send_file, send_lock, send_encoded, EncodedMessage, recv_hello, recv_hello_async, recv_json_async, ZLIB_SUFFIX
 
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -26,66 +29,257 @@ REPO_DIR = 'games_repo'
 GAMES_DB_FILE = 'games_db.json' 
 FORMAT = 'utf-8'
 DB = None
-
-games_db = {}      
+LOBBY_WORKERS = 64 # asyncio 版本中執行指令的執行緒數量 (閒置連線不佔執行緒)
+WRITE_HIGH_WATER = 256 * 1024 # asyncio 版本中輸出緩衝超過此大小才等待送出
+DB_TIMEOUT = 10    # 等待 DB 回覆的秒數
+
+catalog_cache = None # list_catalog 的快取 (遊戲資訊 + 評分統計)，遊戲或評論有變動時清掉
+games_reply = None   # list_all_games 預先編碼好的回覆，同樣在變動時清掉
+# 商城版本號：每次變動加一 (也避免把清除前查到的舊資料存回快取)。
+# 以啟動時間 (毫秒) 起算，Server 重啟後版本號也不會倒退，client 手上的舊版本不會被誤認為最新
+catalog_version = int(time.time() * 1000)
+catalog_lock = threading.Lock()
+CATALOG_SORTS = ('name', 'newest', 'rating', 'play_count') # list_catalog 支援的排序 (不指定則依上架順序)
+REPLY_CACHE_SIZE = 256 # 每個商城版本最多保留幾種查詢的預先編碼回覆
+KEEP_VERSIONS = 3  # 每款遊戲保留最近幾個版本的檔案 (遊戲進行中的玩家仍可能需要舊版)
+SEARCH_LIMIT = 20  # search_games 預設每頁筆數
+search_index = SearchIndex() # 遊戲名稱 + 簡介的搜尋索引，上架/更新/下架時同步增刪
 rooms = {}         
 room_id_counter = 1
-game_port_counter = 12060 
+game_pool = WorkerPool() # 遊戲 Server 行程：預先啟動、分配 port、回收與限制資源
 
 if not os.path.exists(REPO_DIR): os.makedirs(REPO_DIR)
 
-def load_games_db():
-    global games_db
-    if os.path.exists(GAMES_DB_FILE):
-        try:
-            with open(GAMES_DB_FILE, 'r', encoding=FORMAT) as f:
-                games_db = json.load(f)
-            print(f"[LOAD] 已加載 {len(games_db)} 個遊戲")
-        except Exception as e:
-            print(f"[ERROR] 加載遊戲數據庫失敗: {e}")
-            games_db = {}
+def add_version(info, ver, sha256):
+    """版本清單 [{'ver', 'sha256'}, ...] (舊到新) 加入新版本，只留最近 KEEP_VERSIONS 個"""
+    versions = [v for v in (info or {}).get('versions', []) if v['ver'] != ver]
+    versions.append({'ver': ver, 'sha256': sha256})
+    return versions[-KEEP_VERSIONS:]
+
+def version_shas(info):
+    return [v['sha256'] for v in info.get('versions', [])]
+
+def find_version(info, sha256=None, ver=None):
+    """在版本清單中找指定的版本 (優先比對 sha256)，找不到回傳 None"""
+    for v in info.get('versions', []):
+        if (v['sha256'] == sha256) if sha256 is not None else (v['ver'] == ver):
+            return v
+    return None
+
+def precompute_delta(old, new):
+    """新版本上架後先算好「上一版 -> 新版」的差異檔，玩家更新時不必等"""
+    if old == new or not blobs.pin(old): return
+    if blobs.pin(new):
+        blobs.delta(old, new)
+        blobs.release(new)
+    blobs.release(old)
+
+def invalidate_catalog():
+    global catalog_cache, games_reply, catalog_version
+    with catalog_lock:
+        catalog_cache = None
+        games_reply = None
+        catalog_version += 1
+
+def get_games_reply():
+    """list_all_games 的回覆 (帶 version)，編碼結果給所有連線共用直到下次變動"""
+    global games_reply
+    with catalog_lock:
+        if games_reply is not None: return games_reply
+        version = catalog_version
+
+    # store.snapshot() 要拿 store.lock，而 store 在持有 store.lock 時通知 on_game_changed (要拿 catalog_lock)，
+    # 所以不能在 catalog_lock 裡呼叫，否則兩個鎖順序相反會互等；和 get_catalog 一樣，版本沒變才保存
+    games = {name: {k: v for k, v in info.items() if k != 'versions'} for name, info in store.snapshot().items()}
+    reply = EncodedMessage({'status': 'ok', 'version': version, 'games': games})
+    with catalog_lock:
+        if version == catalog_version: games_reply = reply
+    return reply
+
+def get_catalog():
+    """
+    商城列表：{'version': 版本號, 'games': {遊戲名稱: 資訊 + 評分統計},
+    'owners': {user_id: [遊戲名稱]}, 'order': {排序方式: 排好的遊戲名稱 list},
+    'replies': {查詢條件: 預先編碼的回覆}}。
+    有快取直接回傳；沒有就向 DB 查一次所有遊戲的統計後重建 (各種排序也在這時排好，
+    之後每個請求只需篩選、切頁)。DB 無法使用時回傳 None。
+    """
+    global catalog_cache
+    with catalog_lock:
+        if catalog_cache is not None: return catalog_cache
+        version = catalog_version
+
+    games = store.snapshot()
+    resp = db_call({"op": "get_game_stats", "game_names": list(games)})
+    if resp is None or not resp["ok"]: return None
+    stats = resp["data"]["stats"]
+
+    catalog = {'version': version, 'games': {}, 'owners': {}, 'replies': {}}
+    for name, info in games.items():
+        game_stats = stats.get(name, {})
+        catalog['games'][name] = {
+            'ver': info.get('ver'),
+            'player_count': info.get('player_count'),
+            'desc': info.get('desc'),
+            'sha256': info.get('sha256'),
+            'avg_rating': game_stats.get('avg_rating', 0),
+            'review_count': game_stats.get('review_count', 0),
+            'play_count': game_stats.get('play_count', 0),
+        }
+        catalog['owners'].setdefault(info.get('user_id'), []).append(name)
+
+    entries = catalog['games']
+    catalog['order'] = {
+        None: list(entries), # 上架順序
+        'name': sorted(entries),
+        'newest': list(reversed(entries)),
+        'rating': sorted(entries, key=lambda n: (-entries[n]['avg_rating'], -entries[n]['review_count'], n)),
+        'play_count': sorted(entries, key=lambda n: (-entries[n]['play_count'], n)),
+    }
+
+    with catalog_lock:
+        if version == catalog_version: catalog_cache = catalog
+    return catalog
+
+def catalog_reply(catalog, query):
+    """
+    list_catalog 的回覆 (同一個商城版本、同樣的查詢條件共用編碼結果)。
+    query = (user_id, player_count, prefix, sort, offset, limit)，limit 為 None 表示不分頁。
+    """
+    message = catalog['replies'].get(query)
+    if message is not None: return message
+
+    user_id, player_count, prefix, sort, offset, limit = query
+    games = catalog['games']
+    order = catalog['order'][sort]
+    if prefix and sort == 'name':
+        # 依名稱排序的 list 上，相同前綴的遊戲連在一起，二分搜尋找出範圍
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        order = order[bisect.bisect_left(order, prefix):bisect.bisect_left(order, upper)]
+    if user_id is not None or player_count is not None or prefix:
+        owned = set(catalog['owners'].get(user_id, ())) if user_id is not None else None
+        order = [name for name in order
+                 if (owned is None or name in owned)
+                 and (player_count is None or games[name]['player_count'] == player_count)
+                 and name.startswith(prefix)]
+
+    page = order[offset:offset + limit] if limit is not None else order[offset:]
+    next_offset = offset + len(page) if offset + len(page) < len(order) else None
+    message = EncodedMessage({
+        'status': 'ok', 'version': catalog['version'],
+        'total': len(order), 'offset': offset, 'next_offset': next_offset,
+        'games': {name: games[name] for name in page},
+    })
+    if len(catalog['replies']) < REPLY_CACHE_SIZE:
+        catalog['replies'][query] = message
+    return message
+
+def on_game_changed(name, info):
+    """上架/更新/下架後：清掉商城快取、更新搜尋索引、更新檔案的參考計數"""
+    invalidate_catalog()
+    if info is None:
+        search_index.remove(name)
+        blobs.track(name, ())
     else:
-        games_db = {}
-        print("[INIT] 遊戲數據庫文件不存在，創建新的數據庫")
-
-def save_games_db():
-    try:
-        with open(GAMES_DB_FILE, 'w', encoding=FORMAT) as f:
-            json.dump(games_db, f, ensure_ascii=False, indent=2)
-        print(f"[SAVE] 已保存 {len(games_db)} 個遊戲到數據庫")
-    except Exception as e:
-        print(f"[ERROR] 保存遊戲數據庫失敗: {e}")
-
-load_games_db()
+        search_index.add(name, info.get('desc'))
+        blobs.track(name, version_shas(info))
+
+def migrate_repo():
+    """舊資料的遊戲檔是 games_repo/<name>.py：搬進 blobs 並建立版本清單"""
+    for name, info in store.snapshot().items():
+        if 'versions' in info: continue
+        old_path = info['path']
+        if not os.path.exists(old_path):
+            print(f"[ERROR] 遊戲 {name} 的檔案 {old_path} 不存在")
+            continue
+        sha256 = blobs.import_file(old_path)
+        blobs.track(name, [sha256])
+        store.update(name, info.get('user_id'), path=blobs.path(sha256), sha256=sha256,
+                     versions=add_version(None, info.get('ver', 1), sha256))
+        blobs.release(sha256)
+        for path in (old_path, old_path + ZLIB_SUFFIX):
+            if os.path.exists(path): os.remove(path)
+
+store = CatalogStore(GAMES_DB_FILE) # 商城遊戲資料 (遊戲名稱 -> 資訊)，讀寫都透過它加鎖
+blobs = BlobStore(REPO_DIR)         # 遊戲檔案 (以內容 hash 存放，各版本共用)
+for name, info in store.snapshot().items():
+    blobs.track(name, version_shas(info))
+migrate_repo()
+blobs.collect()
+search_index.add_many((name, info.get('desc')) for name, info in store.snapshot().items())
+store.subscribe(on_game_changed)
 
 #分辨是否為DB的連線
 def distinguish_conn(conn, addr):
+    return register_conn(conn, addr, recv_hello(conn))
+
+def register_conn(conn, addr, first):
     global DB 
-    first = recv_text(conn)
     if first is None:
         print(f"[{addr}] connection closed before first message")
         conn.close()
         return False
     if first == "DB":
-        DB = conn
+        DB = DBClient(conn)
         print(f"[{addr}] DB connection established")
         return True
     else:
         print(f"[{addr}] Received: {first} (not DB connection)")
         return False
-    
+
+class DBClient:
+    """
+    多工的 DB 連線：每個請求帶 req_id，多個執行緒可以同時有請求在途 (不必排隊等上一個回覆)，
+    由一條 demux 執行緒接收所有回覆，再依 req_id 交給等待中的執行緒。
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.next_id = 1
+        self.pending = {}   # req_id -> [Event, 回覆]
+        self.closed = False
+        threading.Thread(target=self._demux, daemon=True).start()
+
+    def _demux(self):
+        global DB
+        while True:
+            msg = recv_json(self.sock)
+            if msg is None: break
+            with self.lock:
+                slot = self.pending.pop(msg.pop('req_id', None), None)
+            if slot is None: # 已逾時放棄的請求
+                print(f"[WARN] DB reply without waiter: {msg}")
+                continue
+            slot[1] = msg
+            slot[0].set()
+
+        print("[ERROR] DB connection lost")
+        with self.lock:
+            self.closed = True
+            waiting, self.pending = self.pending, {}
+        for slot in waiting.values(): slot[0].set() # 回覆為 None
+        if DB is self: DB = None
+
+    def call(self, payload):
+        slot = [threading.Event(), None]
+        with self.lock:
+            if self.closed: return None
+            req_id = self.next_id
+            self.next_id += 1
+            self.pending[req_id] = slot
+        send_json(self.sock, dict(payload, req_id=req_id))
+        if not slot[0].wait(DB_TIMEOUT):
+            with self.lock: self.pending.pop(req_id, None)
+            print(f"[ERROR] db_call timeout: {payload.get('op')}")
+            return None
+        return slot[1]
+
 def db_call(payload: dict) -> dict | None:
-    global DB
-    if DB is None:
+    db = DB
+    if db is None:
         print("[ERROR] DB connection not established")
         return None
-    with db_lock:
-        try:
-            send_json(DB, payload)
-            return recv_json(DB)
-        except Exception as e:
-            print(f"[ERROR] db_call failed: {e}")
-            return None
+    return db.call(payload)
         
 def ok(data):
     return {"ok": True, "data": data}
@@ -189,8 +383,392 @@ def distinguish(conn, addr):
         conn.close()
         return False
 
+def reply(conn, req, msg):
+    """回覆一個請求；請求有 req_id 時原樣帶回，讓 client 可以 pipelining 並依 id 對應回覆"""
+    if 'req_id' in req:
+        msg = dict(msg, req_id=req['req_id'])
+    send_json(conn, msg)
+
+def reply_encoded(conn, req, message):
+    """回覆預先編碼好的 EncodedMessage (只插入 req_id，不重新編碼)"""
+    if 'req_id' in req:
+        send_encoded(conn, message, req_id=req['req_id'])
+    else:
+        send_encoded(conn, message)
+
+def reply_cached(conn, req, message):
+    """client 帶的 if_version 與目前版本相同時只回 not_modified，否則回覆完整內容"""
+    version = message.data['version']
+    if req.get('if_version') == version:
+        reply(conn, req, {'status': 'not_modified', 'version': version})
+    else:
+        reply_encoded(conn, req, message)
+
+def push(conn, event, msg):
+    """Server 主動推播 (不是任何請求的回覆)：帶 push 欄位、沒有 req_id"""
+    send_json(conn, dict(msg, push=event))
+
+def handle_request(conn, addr, current_username, req):
+    global room_id_counter
+    cmd = req.get('cmd')
+    
+    # --- 開發者功能---
+    if cmd == 'upload':
+        name = req['name']
+        desc = req['desc']
+        user_id = req['user_id']
+        player_count = req.get('player_count', 2)
+        version = req.get('ver', 1)
+
+        if name in store: #如果遊戲已存在
+            reply(conn, req, {
+                'status': 'fail', 
+                'msg': f'上架失敗：遊戲名稱 "{name}" 已使用。'
+            })
+            return
+
+        print(f"[{addr}] Uploading {name} ver.{version}...")
+        sha256 = blobs.receive(conn, req.get('encoding'))
+        if sha256:
+            added = store.add(name, {'path': blobs.path(sha256), 'desc': desc, 'user_id': user_id, 'player_count': player_count,
+                                     'ver': version, 'sha256': sha256, 'versions': add_version(None, version, sha256)})
+            blobs.release(sha256)
+            if added:
+                reply(conn, req, {'status': 'ok', 'msg': '上架成功'})
+            else: # 接收檔案期間被別人搶先上架同名遊戲
+                reply(conn, req, {'status': 'fail', 'msg': f'上架失敗：遊戲名稱 "{name}" 已使用。'})
+        else:
+            reply(conn, req, {'status': 'fail', 'msg': '文件接收失敗'})
+            print(f"[{addr}] Failed to receive file for {name}")
+    
+    elif cmd == 'delete_game':
+        name = req['name']
+        user_id = req.get('user_id')
+        status = store.delete(name, user_id)
+        if status == 'ok':
+            reply(conn, req, {'status': 'ok', 'msg': '下架成功'})
+        elif status == 'forbidden':
+            reply(conn, req, {'status': 'fail', 'msg': '無權限刪除此遊戲'})
+        else:
+            reply(conn, req, {'status': 'fail', 'msg': '遊戲不存在'})
+    
+    elif cmd == 'list_games':
+        user_id = req.get('user_id')
+        reply(conn, req, {'status': 'ok', 'games': store.by_owner(user_id)})
+        
+    elif cmd == 'update_game':
+        name = req['name']
+        desc = req['desc']
+        user_id = req.get('user_id')
+        player_count = req.get('player_count', 2)
+        new_version = req.get('ver', 1)
+        status = store.check_owner(name, user_id)
+        info = store.get(name)
+        if status == 'not_found' or info is None:
+            reply(conn, req, {'status': 'fail', 'msg': '遊戲不存在'})
+            print(f"[{addr}] Update failed: game '{name}' not found")
+        elif status == 'forbidden':
+            reply(conn, req, {'status': 'fail', 'msg': '無權限更新此遊戲'})
+            print(f"[{addr}] Update failed: no permission for '{name}'")
+        elif req.get('sha256') and req['sha256'] == info.get('sha256'):
+            # 檔案內容沒變，只更新資訊，不必重傳
+            store.update(name, user_id, desc=desc, player_count=player_count, ver=new_version,
+                         versions=add_version(info, new_version, info['sha256']))
+            reply(conn, req, {'status': 'ok', 'code': 'unchanged', 'msg': '檔案內容未變更，已更新遊戲資訊'})
+            print(f"[{addr}] Game '{name}' metadata updated (file unchanged)")
+        else:
+            reply(conn, req, {'status': 'ready', 'msg': '文件上傳中'})
+            
+            # 新版本收完才切換版本清單，接收期間舊版本照常可下載
+            sha256 = blobs.receive(conn, req.get('encoding'))
+            if sha256:
+                status = store.update(name, user_id, path=blobs.path(sha256), desc=desc, player_count=player_count, ver=new_version,
+                                      sha256=sha256, versions=add_version(store.get(name), new_version, sha256))
+                blobs.release(sha256)
+                if status == 'ok':
+                    reply(conn, req, {'status': 'ok', 'msg': '更新成功'})
+                    print(f"[{addr}] Game '{name}' updated successfully")
+                    threading.Thread(target=precompute_delta, args=(info['sha256'], sha256), daemon=True).start()
+                else: # 接收檔案期間遊戲被下架
+                    reply(conn, req, {'status': 'fail', 'msg': '遊戲不存在'})
+            else:
+                reply(conn, req, {'status': 'fail', 'msg': '文件接收失敗'})
+                print(f"[{addr}] Failed to receive file for update {name}")
+    
+    elif cmd == 'logout':
+        # 更新用戶的 is_connected 狀態為 0
+        # 統一使用 username 登出
+        username = req.get('username')
+        
+        if not username:
+            reply(conn, req, {'status': 'fail', 'msg': '缺少用戶名'})
+            print(f"[{addr}] Logout failed: missing username")
+            return
+        
+        print(f"[{addr}] Logout request for username: {username}")
+        set_resp = db_call({
+            "op": "set_user_connected",
+            "username": username,
+            "is_connected": 0
+        })
+        
+        print(f"[{addr}] Logout db_call response: {set_resp}")
+        if set_resp and set_resp.get("ok"):
+            reply(conn, req, {'status': 'ok', 'msg': '登出成功'})
+            print(f"[{addr}] Logout successful for {username}")
+        else:
+            reply(conn, req, {'status': 'fail', 'msg': f'登出失敗: {set_resp.get("error") if set_resp else "無響應"}'})
+            print(f"[{addr}] Logout failed: {set_resp}")
+    
+    # --- 玩家功能---
+    elif cmd == 'list_all_games':
+        reply_cached(conn, req, get_games_reply())
+    elif cmd == 'download':
+        # 可帶 offset / length 只下載一段 (續傳)；帶 sha256 (或 ver) 時只傳那個版本，
+        # 已經不保留就回覆 version_gone (續傳中則是 stale_range)，不會改傳別的版本；都沒帶才傳最新版
+        # 帶 compress='zlib' 時傳壓縮版，offset / length / size 都以壓縮檔計算
+        name = req['name']
+        offset = int(req.get('offset', 0))
+        length = req.get('length')
+        print(f"[{addr}] Download request for: {name} (offset {offset})")
+        info = store.get(name)
+        if info is not None:
+            gone = {'status': 'fail', 'code': 'stale_range' if offset else 'version_gone',
+                    'msg': '這個版本已不再提供，請重新整理商城後下載'}
+            if req.get('sha256') is not None or req.get('ver') is not None:
+                wanted = find_version(info, req.get('sha256'), req.get('ver'))
+            else:
+                wanted = {'ver': info.get('ver'), 'sha256': info.get('sha256')}
+            if wanted is None:
+                reply(conn, req, gone)
+                return
+            ver, sha256 = wanted['ver'], wanted['sha256']
+            # 傳送期間持有檔案，避免這個版本剛好被新版本擠掉而刪除
+            if not blobs.pin(sha256):
+                reply(conn, req, gone)
+                return
+            try:
+                path = blobs.path(sha256)
+                encoding = 'identity'
+                if req.get('compress') == 'zlib':
+                    encoding = 'zlib'
+                    path += ZLIB_SUFFIX
+                size = os.path.getsize(path)
+                if not 0 <= offset <= size:
+                    reply(conn, req, {'status': 'fail', 'code': 'bad_range', 'msg': f'下載範圍錯誤 (檔案大小 {size})'})
+                    return
+                length = size - offset if length is None else min(int(length), size - offset)
+                print(f"[{addr}] Sending file: {path} [{offset}:{offset + length}]")
+                # 回覆與檔案內容之間不能插入其他執行緒的推播
+                with send_lock(conn):
+                    reply(conn, req, {'status': 'ok', 'ver': ver, 'sha256': sha256, 'encoding': encoding,
+                                     'size': size, 'offset': offset, 'length': length})
+                    send_file(conn, path, offset, length)
+            finally:
+                blobs.release(sha256)
+            print(f"[{addr}] File sent successfully")
+        else:
+            print(f"[{addr}] Game not found: {name}")
+            reply(conn, req, {'status': 'fail', 'msg': '遊戲不存在'})
+
+    elif cmd == 'download_delta':
+        # 已有舊版的玩家只下載差異檔：from_sha256 (或 from_ver) 是玩家手上的版本，
+        # to_sha256 / to_ver 不帶就是最新版。沒有可用的差異檔 (舊版已不保留、差異檔不比完整檔小) 時
+        # 回覆 code='no_delta'，玩家改用 download 下載完整檔案
+        name = req['name']
+        info = store.get(name)
+        if info is None:
+            reply(conn, req, {'status': 'fail', 'msg': '遊戲不存在'})
+            return
+        old = find_version(info, req.get('from_sha256'), req.get('from_ver'))
+        new = find_version(info, req.get('to_sha256'), req.get('to_ver', info.get('ver')))
+        no_delta = {'status': 'fail', 'code': 'no_delta', 'msg': '沒有可用的差異檔，請下載完整檔案'}
+        if old is None or new is None or old['sha256'] == new['sha256']:
+            reply(conn, req, no_delta)
+            return
+        if not blobs.pin(old['sha256']):
+            reply(conn, req, no_delta)
+            return
+        try:
+            if not blobs.pin(new['sha256']):
+                reply(conn, req, no_delta)
+                return
+            try:
+                path = blobs.delta(old['sha256'], new['sha256'])
+                if path is None:
+                    reply(conn, req, no_delta)
+                    return
+                size = os.path.getsize(path)
+                print(f"[{addr}] Sending delta {name}: ver.{old['ver']} -> ver.{new['ver']} ({size} bytes)")
+                with send_lock(conn):
+                    reply(conn, req, {'status': 'ok', 'from_ver': old['ver'], 'from_sha256': old['sha256'],
+                                     'ver': new['ver'], 'sha256': new['sha256'], 'size': size})
+                    send_file(conn, path)
+            finally:
+                blobs.release(new['sha256'])
+        finally:
+            blobs.release(old['sha256'])
+
+    elif cmd == 'list_rooms':
+        # 顯示房間列表，包含遊戲名稱和玩家數量
+        # 過濾掉已下架遊戲的房間
+        room_list = {}
+        rooms_to_remove = []
+        for rid, r in rooms.items():
+            game_name = r['game']
+            # 檢查遊戲是否還存在（未被下架）
+            if game_name not in store:
+                # 遊戲已下架，通知房間內的所有玩家
+                for player in r['players']:
+                    try:
+                        push(player['conn'], 'room_closed', {'status': 'fail', 'msg': '該遊戲已下架，房間已關閉'})
+                    except:
+                        pass
+                # 標記房間需要移除
+                rooms_to_remove.append(rid)
+                continue
+            player_count = len(r['players'])
+            required_count = r['required_count']
+            room_list[rid] = {
+                'game_name': game_name,
+                'player_count': player_count,
+                'required_count': required_count,
+                'display': f"{game_name} ({player_count}/{required_count})" 
+            }
+        # 清理已下架遊戲的房間
+        for rid in rooms_to_remove:
+            del rooms[rid]
+        reply(conn, req, {'status': 'ok', 'rooms': room_list})
+
+    elif cmd == 'create_room':
+        game_name = req['game_name']
+        # 檢查遊戲是否存在
+        info = store.get(game_name)
+        if info is None:
+            reply(conn, req, {'status': 'fail', 'msg': '遊戲不存在'})
+            return
+        required_count = info.get('player_count', 2)
+        rid = room_id_counter
+        room_id_counter += 1
+        # 存儲房間信息，包含遊戲名稱
+        rooms[rid] = {'game': game_name, 'players': [{'conn': conn, 'name': current_username}], 'required_count': required_count}
+        game_pool.warm(info['path']) # 趁等待其他玩家時先把遊戲 Server 準備好
+        reply(conn, req, {'status': 'ok', 'room_id': rid, 'msg': '等待玩家加入...'})
+
+    elif cmd == 'join_room':
+        rid = int(req['room_id'])
+        if rid not in rooms:
+            reply(conn, req, {'status': 'fail', 'msg': '房間不存在或人數已滿'})
+            return
+        
+        room = rooms[rid]
+        if len(room['players']) < room['required_count']:
+            room['players'].append({'conn': conn, 'name': current_username})
+            reply(conn, req, {'status': 'ok', 'msg': '等待其他玩家加入...'})
+
+        if len(room['players']) == room['required_count']:
+            game_name = room['game']
+            players_in_room = room['players']
+            
+            del rooms[rid]
+            info = store.get(game_name)
+            worker = game_pool.acquire(info['path']) if info else None
+            if worker is None:
+                for player in players_in_room:
+                    push(player['conn'], 'room_closed', {'status': 'fail', 'msg': '遊戲啟動失敗 (或伺服器忙碌)，房間已關閉'})
+                print(f"[Room {rid}] Failed to start game: {game_name}")
+                return
+            game_port = worker.port
+            print(f"[Room {rid}] Starting Game: {game_name} on Port {game_port}")
+
+            # 先寫入遊玩紀錄並清掉商城快取 (play_count 與排序要重算)，玩家收到 game_start 後查到的就是新的次數
+            for player in players_in_room:
+                db_call({"op": "add_play_record", "username": player['name'], "game_name": game_name})
+            invalidate_catalog()
+            for i, player in enumerate(players_in_room):
+                role = f'P{i+1}'
+                push(player['conn'], 'game_start', {'status': 'game_start', 'port': game_port, 'role': role, 'game': game_name,
+                                                    'ver': info.get('ver'), 'sha256': info.get('sha256')})
+            print(f"[Room {rid}] Game started and room deleted.")
+        else:
+            reply(conn, req, {'status': 'ok', 'msg': '等待其他玩家加入...'})
+    
+    elif cmd == 'session_stats':
+        # 遊戲 Server 行程的數量：live 進行中、idle 預先啟動待命、finished 已結束 (killed 為其中超時被結束的)
+        reply(conn, req, dict(game_pool.stats(), status='ok', rooms=len(rooms)))
+
+    elif cmd == 'list_catalog':
+        # 商城列表 + 評分統計。可分頁 (offset / limit)、篩選 (user_id / player_count / prefix)、
+        # 排序 (sort，見 CATALOG_SORTS)；不帶 limit 時回傳全部
+        try:
+            player_count = req.get('player_count')
+            if player_count is not None: player_count = int(player_count)
+            offset = max(0, int(req.get('offset', 0)))
+            limit = req.get('limit')
+            if limit is not None: limit = max(1, int(limit))
+            sort = req.get('sort')
+            if sort is not None and sort not in CATALOG_SORTS: raise ValueError(sort)
+        except (TypeError, ValueError):
+            reply(conn, req, {'status': 'fail', 'msg': '查詢參數錯誤'})
+            return
+        catalog = get_catalog()
+        if catalog is None:
+            reply(conn, req, {'status': 'fail', 'msg': '無法取得商城列表'})
+            return
+        query = (req.get('user_id'), player_count, req.get('prefix') or '', sort, offset, limit)
+        reply_cached(conn, req, catalog_reply(catalog, query))
+
+    elif cmd == 'search_games':
+        # 依關鍵字搜尋遊戲名稱與簡介 (空白分隔的多個關鍵字都要符合)，可用 offset / limit 分頁
+        try:
+            offset = max(0, int(req.get('offset', 0)))
+            limit = max(1, int(req.get('limit', SEARCH_LIMIT)))
+        except (TypeError, ValueError):
+            reply(conn, req, {'status': 'fail', 'msg': '查詢參數錯誤'})
+            return
+        catalog = get_catalog()
+        if catalog is None:
+            reply(conn, req, {'status': 'fail', 'msg': '無法取得商城列表'})
+            return
+        total, names = search_index.search(str(req.get('query', '')), offset, limit)
+        games = {name: catalog['games'][name] for name in names if name in catalog['games']}
+        next_offset = offset + len(names) if offset + len(names) < total else None
+        reply(conn, req, {'status': 'ok', 'total': total, 'offset': offset, 'next_offset': next_offset, 'games': games})
+
+    elif cmd == 'get_reviews':
+        game_name = req['name']
+        resp = db_call({"op": "get_game_reviews", "game_name": game_name})
+        reply(conn, req, {'status': 'ok', 'reviews': resp['data']['reviews']})
+
+    elif cmd == 'get_game_stats':
+        # 多款遊戲的評分統計一次查完 (評論數、平均評分、1~5 星分布、遊玩次數)
+        resp = db_call({"op": "get_game_stats", "game_names": req.get('names', [])})
+        if resp is None or not resp["ok"]:
+            reply(conn, req, {'status': 'fail', 'msg': '無法取得遊戲統計'})
+            return
+        reply(conn, req, {'status': 'ok', 'stats': resp['data']['stats']})
+
+    elif cmd == 'submit_review':
+        # 檢查前置條件：是否玩過
+        check = db_call({"op": "check_play_eligibility", "username": current_username, "game_name": req['name']})
+        if not check['data']['eligible']:
+            reply(conn, req, {'status': 'fail', 'msg': '您尚未遊玩過此遊戲，無法評分。'})
+            return
+
+        current_ver = (store.get(req['name']) or {}).get('ver', '1')
+
+        db_call({
+            "op": "submit_review",
+            "game_name": req['name'],
+            "username": current_username,
+            "version": str(current_ver),
+            "rating": req['rating'],
+            "comment": req['comment']
+        })
+        invalidate_catalog()
+        reply(conn, req, {'status': 'ok', 'msg': '評價提交成功！'})
+
 def handle_client(conn, addr):
-    global room_id_counter, game_port_counter
     print(f"[NEW] {addr} connected.")
     current_username = None
     
@@ -205,244 +783,28 @@ def handle_client(conn, addr):
         while True:
             req = recv_json(conn)
             if not req: break
-            
-            cmd = req.get('cmd')
-            
-            # --- 開發者功能---
-            if cmd == 'upload':
-                name = req['name']
-                desc = req['desc']
-                user_id = req['user_id']
-                player_count = req.get('player_count', 2)
-                version = req.get('ver', 1)
-
-                if name in games_db: #如果遊戲已存在
-                    send_json(conn, {
-                        'status': 'fail', 
-                        'msg': f'上架失敗：遊戲名稱 "{name}" 已使用。'
-                    })
-                    continue
-
-                print(f"[{addr}] Uploading {name} ver.{version}...")
-                save_path = os.path.join(REPO_DIR, f"{name}.py")
-                if recv_file(conn, save_path):
-                    games_db[name] = {'path': save_path, 'desc': desc, 'user_id': user_id, 'player_count': player_count, 'ver': version}
-                    save_games_db() 
-                    send_json(conn, {'status': 'ok', 'msg': '上架成功'})
-                else:
-                    send_json(conn, {'status': 'fail', 'msg': '文件接收失敗'})
-                    print(f"[{addr}] Failed to receive file for {name}")
-            
-            elif cmd == 'delete_game':
-                name = req['name']
-                user_id = req.get('user_id')
-                if name in games_db:
-                    if games_db[name].get('user_id') == user_id:
-                        del games_db[name]
-                        save_games_db()  
-                        send_json(conn, {'status': 'ok', 'msg': '下架成功'})
-                    else:
-                        send_json(conn, {'status': 'fail', 'msg': '無權限刪除此遊戲'})
-                else:
-                    send_json(conn, {'status': 'fail', 'msg': '遊戲不存在'})
-            
-            elif cmd == 'list_games':
-                user_id = req.get('user_id')
-                user_games = {name: info for name, info in games_db.items() 
-                             if info.get('user_id') == user_id}
-                send_json(conn, {'status': 'ok', 'games': user_games})
-                
-            elif cmd == 'update_game':
-                name = req['name']
-                desc = req['desc']
-                user_id = req.get('user_id')
-                player_count = req.get('player_count', 2)
-                new_version = req.get('ver', 1)
-                if name not in games_db:
-                    send_json(conn, {'status': 'fail', 'msg': '遊戲不存在'})
-                    print(f"[{addr}] Update failed: game '{name}' not found")
-                elif games_db[name].get('user_id') != user_id:
-                    send_json(conn, {'status': 'fail', 'msg': '無權限更新此遊戲'})
-                    print(f"[{addr}] Update failed: no permission for '{name}'")
-                else:
-                    send_json(conn, {'status': 'ready', 'msg': '文件上傳中'})
-                    
-                    old_path = games_db[name]['path']
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                    
-                    # 接收新的遊戲文件並覆蓋
-                    save_path = os.path.join(REPO_DIR, f"{name}.py")
-                    if recv_file(conn, save_path):
-                        games_db[name] = {'path': save_path, 'desc': desc, 'user_id': user_id, 'player_count': player_count, 'ver': new_version}
-                        save_games_db()
-                        send_json(conn, {'status': 'ok', 'msg': '更新成功'})
-                        print(f"[{addr}] Game '{name}' updated successfully")
-                    else:
-                        send_json(conn, {'status': 'fail', 'msg': '文件接收失敗'})
-                        print(f"[{addr}] Failed to receive file for update {name}")
-            
-            elif cmd == 'logout':
-                # 更新用戶的 is_connected 狀態為 0
-                # 統一使用 username 登出
-                username = req.get('username')
-                
-                if not username:
-                    send_json(conn, {'status': 'fail', 'msg': '缺少用戶名'})
-                    print(f"[{addr}] Logout failed: missing username")
-                    continue
-                
-                print(f"[{addr}] Logout request for username: {username}")
-                set_resp = db_call({
-                    "op": "set_user_connected",
-                    "username": username,
-                    "is_connected": 0
-                })
-                
-                print(f"[{addr}] Logout db_call response: {set_resp}")
-                if set_resp and set_resp.get("ok"):
-                    send_json(conn, {'status': 'ok', 'msg': '登出成功'})
-                    print(f"[{addr}] Logout successful for {username}")
-                else:
-                    send_json(conn, {'status': 'fail', 'msg': f'登出失敗: {set_resp.get("error") if set_resp else "無響應"}'})
-                    print(f"[{addr}] Logout failed: {set_resp}")
-            
-            # --- 玩家功能---
-            elif cmd == 'list_all_games':
-                send_json(conn, {'status': 'ok', 'games': games_db})
-            elif cmd == 'download':
-                name = req['name']
-                print(f"[{addr}] Download request for: {name}")
-                if name in games_db:
-                    print(f"[{addr}] Sending file: {games_db[name]['path']}")
-                    send_json(conn, {'status': 'ok'})
-                    send_file(conn, games_db[name]['path'])
-                    print(f"[{addr}] File sent successfully")
-                else:
-                    print(f"[{addr}] Game not found: {name}")
-                    send_json(conn, {'status': 'fail', 'msg': '遊戲不存在'})
-
-            elif cmd == 'list_rooms':
-                # 顯示房間列表，包含遊戲名稱和玩家數量
-                # 過濾掉已下架遊戲的房間
-                room_list = {}
-                rooms_to_remove = []
-                for rid, r in rooms.items():
-                    game_name = r['game']
-                    # 檢查遊戲是否還存在（未被下架）
-                    if game_name not in games_db:
-                        # 遊戲已下架，通知房間內的所有玩家
-                        for player in r['players']:
-                            try:
-                                send_json(player, {'status': 'fail', 'msg': '該遊戲已下架，房間已關閉'})
-                            except:
-                                pass
-                        # 標記房間需要移除
-                        rooms_to_remove.append(rid)
-                        continue
-                    player_count = len(r['players'])
-                    required_count = r['required_count']
-                    room_list[rid] = {
-                        'game_name': game_name,
-                        'player_count': player_count,
-                        'required_count': required_count,
-                        'display': f"{game_name} ({player_count}/{required_count})" 
-                    }
-                # 清理已下架遊戲的房間
-                for rid in rooms_to_remove:
-                    del rooms[rid]
-                send_json(conn, {'status': 'ok', 'rooms': room_list})
-
-            elif cmd == 'create_room':
-                game_name = req['game_name']
-                # 檢查遊戲是否存在
-                if game_name not in games_db:
-                    send_json(conn, {'status': 'fail', 'msg': '遊戲不存在'})
-                    continue
-                required_count = games_db[game_name].get('player_count', 2)
-                rid = room_id_counter
-                room_id_counter += 1
-                # 存儲房間信息，包含遊戲名稱
-                rooms[rid] = {'game': game_name, 'players': [{'conn': conn, 'name': current_username}], 'required_count': required_count}
-                send_json(conn, {'status': 'ok', 'room_id': rid, 'msg': '等待玩家加入...'})
-
-            elif cmd == 'join_room':
-                rid = int(req['room_id'])
-                if rid not in rooms:
-                    send_json(conn, {'status': 'fail', 'msg': '房間不存在或人數已滿'})
-                    continue
-                
-                room = rooms[rid]
-                if len(room['players']) < room['required_count']:
-                    room['players'].append({'conn': conn, 'name': current_username})
-                    send_json(conn, {'status': 'ok', 'msg': '等待其他玩家加入...'})
-
-                if len(room['players']) == room['required_count']:
-                    game_name = room['game']
-                    players_in_room = room['players']
-                    
-                    game_port = game_port_counter
-                    game_port_counter += 1
-                    
-                    print(f"[Room {rid}] Starting Game: {game_name} on Port {game_port}")
-                    
-                    game_script = games_db[game_name]['path']
-
-                    subprocess.Popen([sys.executable, game_script, 'server', str(game_port)])
-                    
-                    time.sleep(1)
-
-                    for i, player in enumerate(players_in_room):
-                        role = f'P{i+1}'
-                        send_json(player['conn'], {'status': 'game_start', 'port': game_port, 'role': role, 'game': game_name})
-                        db_call({"op": "add_play_record", "username": player['name'], "game_name": game_name})
-                    
-                    del rooms[rid]
-                    print(f"[Room {rid}] Game started and room deleted.")
-                else:
-                    send_json(conn, {'status': 'ok', 'msg': '等待其他玩家加入...'})
-            
-            elif cmd == 'get_reviews':
-                game_name = req['name']
-                resp = db_call({"op": "get_game_reviews", "game_name": game_name})
-                send_json(conn, {'status': 'ok', 'reviews': resp['data']['reviews']})
-
-            elif cmd == 'submit_review':
-                # 檢查前置條件：是否玩過
-                check = db_call({"op": "check_play_eligibility", "username": current_username, "game_name": req['name']})
-                if not check['data']['eligible']:
-                    send_json(conn, {'status': 'fail', 'msg': '您尚未遊玩過此遊戲，無法評分。'})
-                    continue
-
-                current_ver = games_db.get(req['name'], {}).get('ver', '1')
-
-                db_call({
-                    "op": "submit_review",
-                    "game_name": req['name'],
-                    "username": current_username,
-                    "version": str(current_ver),
-                    "rating": req['rating'],
-                    "comment": req['comment']
-                })
-                send_json(conn, {'status': 'ok', 'msg': '評價提交成功！'})
+            handle_request(conn, addr, current_username, req)
 
     except Exception as e:
         print(f"[{addr}] Error: {e}")
     finally:
-        if current_username:
-            print(f"[{addr}] 使用者 {current_username} 離線，正在更新資料庫狀態...")
-            db_call({
-                "op": "set_user_connected",
-                "username": current_username,
-                "is_connected": 0
-            })
-            
-        for rid in list(rooms.keys()):
-            rooms[rid]['players'] = [p for p in rooms[rid]['players'] if p['conn'] != conn]
-            if not rooms[rid]['players']: del rooms[rid]
+        cleanup_client(conn, addr, current_username)
 
-        conn.close()
-        print(f"[{addr}] 連線已關閉。")
+def cleanup_client(conn, addr, current_username):
+    if current_username:
+        print(f"[{addr}] 使用者 {current_username} 離線，正在更新資料庫狀態...")
+        db_call({
+            "op": "set_user_connected",
+            "username": current_username,
+            "is_connected": 0
+        })
+        
+    for rid in list(rooms.keys()):
+        rooms[rid]['players'] = [p for p in rooms[rid]['players'] if p['conn'] != conn]
+        if not rooms[rid]['players']: del rooms[rid]
+
+    conn.close()
+    print(f"[{addr}] 連線已關閉。")
 
 def start_server():
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -459,5 +821,87 @@ def start_server():
             thread.start()
             print(f"[ACTIVE CONNECTIONS] {threading.active_count()-1}")
 
+# ============================================
+# asyncio 版本 (python server.py --asyncio)
+# 閒置連線只是一個等待中的協程；收到請求後才交給 worker 執行緒跑 handle_request
+# ============================================
+
+class AsyncConn:
+    """
+    把 asyncio 的 StreamReader / StreamWriter 包成 socket 介面 (sendall / recv_into / sendfile / close)，
+    讓 handle_request 等同步程式在 worker 執行緒裡照常使用 common.py 的函式，實際 I/O 都在 event loop 上進行。
+    協程裡要用 *_async 的版本 (在 event loop 執行緒呼叫同步版本會卡死)。
+    """
+    def __init__(self, reader, writer, loop):
+        self.reader = reader
+        self.writer = writer
+        self.loop = loop
+
+    async def recv_into_async(self, view, nbytes=0):
+        data = await self.reader.read(nbytes or len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    async def sendall_async(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def recv_into(self, view, nbytes=0):
+        return self._run(self.recv_into_async(view, nbytes))
+
+    def sendall(self, data):
+        # writer.write 只能在 event loop 執行緒呼叫；排進 loop 後不必等它，
+        # 只有輸出緩衝區積太多時才等 drain (call_soon_threadsafe 依序執行，不會打亂順序)
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+        if self.writer.transport.get_write_buffer_size() + len(data) > WRITE_HIGH_WATER:
+            self._run(self.writer.drain())
+
+    def sendfile(self, file, offset=0, count=None):
+        return self._run(self.loop.sendfile(self.writer.transport, file, offset, count))
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+async def handle_client_async(reader, writer):
+    loop = asyncio.get_running_loop()
+    conn = AsyncConn(reader, writer, loop)
+    addr = writer.get_extra_info('peername')
+    if register_conn(conn, addr, await recv_hello_async(conn)):
+        print("DB/GS connected")
+        return # DB 連線之後由 DBClient 的 demux 執行緒讀取
+    print(f"[NEW] {addr} connected.")
+    current_username = None
+
+    try:
+        #註冊/登入
+        user_info = await loop.run_in_executor(None, distinguish, conn, addr)
+        if isinstance(user_info, dict) and "name" in user_info:
+            current_username = user_info["name"]
+        else: return
+
+        #登入成功
+        while True:
+            req = await recv_json_async(conn)
+            if not req: break
+            await loop.run_in_executor(None, handle_request, conn, addr, current_username, req)
+
+    except Exception as e:
+        print(f"[{addr}] Error: {e}")
+    finally:
+        await loop.run_in_executor(None, cleanup_client, conn, addr, current_username)
+
+async def start_server_async():
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=LOBBY_WORKERS))
+    server = await asyncio.start_server(handle_client_async, SERVER, PORT, reuse_address=True)
+    print(f"[LOBBY SERVER] (asyncio) Running on {SERVER}:{PORT}")
+    async with server:
+        await server.serve_forever()
+
 if __name__ == "__main__":
-    start_server()
+    if '--asyncio' in sys.argv:
+        asyncio.run(start_server_async())
+    else:
+        start_server()
@@ -0,0 +1,245 @@
+import os
+import json
+import threading
+from common import file_sha256
+
+FORMAT = 'utf-8'
+COMPACT_EVERY = 1000    # 日誌累積這麼多筆就壓縮回快照
+
+def fsync_dir(path):
+    """rename 之後把目錄也 fsync，確保新檔名寫進磁碟 (Windows 不支援，略過)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class Journal:
+    """
+    只追加的日誌：每次修改寫一行 JSON。
+    fsync 交給背景執行緒批次處理：等待 fsync 的期間進來的修改會在下一次一起 fsync (group commit)，
+    寫入端呼叫 wait(seq) 等到自己那筆真的落盤。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.cond = threading.Condition()
+        self.sync_lock = threading.Lock()   # fsync 期間不可關閉/截斷檔案
+        self.file = open(path, 'a', encoding=FORMAT)
+        self.written = 0    # 已寫入的筆數 (序號)
+        self.synced = 0     # 已 fsync 的筆數
+        self.records = 0    # 目前日誌檔裡的筆數 (壓縮後歸零)
+        threading.Thread(target=self._flusher, daemon=True).start()
+
+    def append(self, record):
+        """寫入一筆，回傳它的序號"""
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self.cond:
+            self.file.write(line)
+            self.written += 1
+            self.records += 1
+            self.cond.notify_all()
+            return self.written
+
+    def wait(self, seq):
+        """等到第 seq 筆已經 fsync"""
+        with self.cond:
+            while self.synced < seq:
+                self.cond.wait()
+
+    def _flusher(self):
+        while True:
+            with self.cond:
+                while self.synced == self.written:
+                    self.cond.wait()
+            with self.sync_lock:
+                with self.cond:
+                    seq = self.written
+                    self.file.flush()
+                    fd = self.file.fileno()
+                # fsync 時不持有 cond，其他執行緒可以繼續寫下一批
+                try:
+                    os.fsync(fd)
+                except OSError as e:
+                    print(f"[ERROR] 日誌 fsync 失敗: {e}")
+            with self.cond:
+                self.synced = max(self.synced, seq)
+                self.cond.notify_all()
+
+    def reset(self):
+        """快照已經包含所有紀錄：清空日誌，等待中的寫入端也一併放行"""
+        with self.sync_lock:
+            with self.cond:
+                self.file.close()
+                self.file = open(self.path, 'w', encoding=FORMAT)
+                self.records = 0
+                self.synced = self.written
+                self.cond.notify_all()
+
+class CatalogStore:
+    """
+    商城的遊戲資料：遊戲名稱 -> {'path', 'desc', 'user_id', 'player_count', 'ver', 'sha256', 'versions'}
+    ('path' / 'ver' / 'sha256' 是目前版本，'versions' 是保留檔案的各版本清單)。
+    所有讀寫都經過這裡並加鎖，另外維護 user_id -> 遊戲名稱 的索引 (查開發者自己的遊戲不必掃過全部)。
+    回傳的資料都是複本，修改只能透過 add / update / delete。
+
+    持久化：path 是快照 (整份 JSON)，path + '.journal' 是之後每次修改的日誌。
+    每次修改只追加一行並等 fsync (O(1))，日誌滿 COMPACT_EVERY 筆才寫新快照 (先寫暫存檔再 rename，
+    不會留下寫一半的快照) 並清空日誌。啟動時讀快照再重播日誌；日誌每筆都記完整資訊，重播多次結果相同。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.lock = threading.RLock()
+        self.games = {}
+        self.owners = {}    # user_id -> {遊戲名稱: None} (dict 當作保留上架順序的 set)
+        self.listeners = []
+        replayed = self.load()
+        self.journal = Journal(self.journal_path)
+        if replayed: self.compact()
+
+    def load(self):
+        """讀快照 + 重播日誌，回傳是否需要立刻壓縮"""
+        games = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding=FORMAT) as f:
+                    games = json.load(f)
+            except Exception as e:
+                print(f"[ERROR] 加載遊戲數據庫失敗: {e}")
+        else:
+            print("[INIT] 遊戲數據庫文件不存在，創建新的數據庫")
+        replayed = self.replay(games)
+        print(f"[LOAD] 已加載 {len(games)} 個遊戲 (重播日誌 {replayed} 筆)")
+        with self.lock:
+            self.games = games
+            self.owners = {}
+            for name, info in games.items():
+                self.owners.setdefault(info.get('user_id'), {})[name] = None
+            # 舊資料沒有內容 hash，啟動時補算一次
+            missing = [n for n, info in games.items() if 'sha256' not in info and os.path.exists(info['path'])]
+            for name in missing:
+                games[name]['sha256'] = file_sha256(games[name]['path']).hexdigest()
+        return bool(replayed or missing)
+
+    def replay(self, games):
+        if not os.path.exists(self.journal_path): return 0
+        count = 0
+        with open(self.journal_path, 'r', encoding=FORMAT) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 最後一行寫到一半就當機：那筆修改沒有回覆成功，丟掉即可
+                    print(f"[WARN] 日誌第 {count + 1} 筆不完整，忽略之後的內容")
+                    break
+                if record['op'] == 'put':
+                    games[record['name']] = record['info']
+                else:
+                    games.pop(record['name'], None)
+                count += 1
+        return count
+
+    def compact(self):
+        """把目前的資料寫成新快照，成功後清空日誌"""
+        with self.lock:
+            tmp = self.path + '.tmp'
+            try:
+                with open(tmp, 'w', encoding=FORMAT) as f:
+                    json.dump(self.games, f, ensure_ascii=False, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+                fsync_dir(self.path)
+            except Exception as e:
+                # 快照沒寫成功就保留日誌，資料仍可由舊快照 + 日誌還原
+                print(f"[ERROR] 保存遊戲數據庫失敗: {e}")
+                return
+            self.journal.reset()
+            print(f"[SAVE] 已保存 {len(self.games)} 個遊戲到數據庫")
+
+    def subscribe(self, listener):
+        """listener(name, info) 在每次上架/更新/下架後呼叫 (仍持有鎖，依變動順序)；下架時 info 為 None"""
+        self.listeners.append(listener)
+
+    def _changed(self, name):
+        """寫日誌並通知 listener，回傳日誌序號 (呼叫端放開鎖後再 wait)"""
+        info = self.games.get(name)
+        if info is None:
+            seq = self.journal.append({'op': 'del', 'name': name})
+        else:
+            seq = self.journal.append({'op': 'put', 'name': name, 'info': info})
+        if self.journal.records >= COMPACT_EVERY:
+            self.compact()
+        for listener in self.listeners:
+            listener(name, dict(info) if info is not None else None)
+        return seq
+
+    # --- 查詢 ---
+    def __contains__(self, name):
+        with self.lock:
+            return name in self.games
+
+    def __len__(self):
+        with self.lock:
+            return len(self.games)
+
+    def get(self, name):
+        with self.lock:
+            info = self.games.get(name)
+            return dict(info) if info is not None else None
+
+    def snapshot(self):
+        """所有遊戲的複本 (依上架順序)"""
+        with self.lock:
+            return {name: dict(info) for name, info in self.games.items()}
+
+    def by_owner(self, user_id):
+        """某位開發者的所有遊戲"""
+        with self.lock:
+            return {name: dict(self.games[name]) for name in self.owners.get(user_id, ())}
+
+    def check_owner(self, name, user_id):
+        """回傳 'ok' / 'not_found' / 'forbidden'"""
+        with self.lock:
+            if name not in self.games: return 'not_found'
+            if self.games[name].get('user_id') != user_id: return 'forbidden'
+            return 'ok'
+
+    # --- 修改 (落盤後才回傳) ---
+    def add(self, name, info):
+        """上架；名稱已被使用時回傳 False"""
+        with self.lock:
+            if name in self.games: return False
+            self.games[name] = dict(info)
+            self.owners.setdefault(info.get('user_id'), {})[name] = None
+            seq = self._changed(name)
+        self.journal.wait(seq)
+        return True
+
+    def update(self, name, user_id, **fields):
+        """開發者更新自己的遊戲；回傳 'ok' / 'not_found' / 'forbidden'"""
+        with self.lock:
+            status = self.check_owner(name, user_id)
+            if status != 'ok': return status
+            self.games[name].update(fields)
+            seq = self._changed(name)
+        self.journal.wait(seq)
+        return status
+
+    def delete(self, name, user_id):
+        """開發者下架自己的遊戲；回傳 'ok' / 'not_found' / 'forbidden'"""
+        with self.lock:
+            status = self.check_owner(name, user_id)
+            if status != 'ok': return status
+            del self.games[name]
+            owned = self.owners[user_id]
+            del owned[name]
+            if not owned: del self.owners[user_id]
+            seq = self._changed(name)
+        self.journal.wait(seq)
+        return status
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+
+#端對端測試：在暫存資料夾裡啟動 server.py + DB.py，上架遊戲、開房間玩一局後，
+#list_catalog 的 play_count 與依遊玩次數的排序要立刻反映 (不能沿用舊的商城快取)
+#python -m pytest tests 或 python tests/test_catalog.py
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from common import send_hello, send_json, recv_json, send_file, call, recv_push
+
+GAME = os.path.join(ROOT, 'tictactoe.py')
+
+def wait_for(path, text, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if text in line: return line
+        time.sleep(0.1)
+    raise RuntimeError(f"timed out waiting for '{text}' in {path}")
+
+def start_lobby(workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    log = os.path.join(workdir, 'server.log')
+    lobby = subprocess.Popen([sys.executable, '-u', os.path.join(ROOT, 'server', 'server.py')],
+                             cwd=workdir, env=env, stdout=open(log, 'w'), stderr=subprocess.STDOUT)
+    host, port = wait_for(log, 'Running on').rsplit(' ', 1)[1].strip().rsplit(':', 1)
+    db = subprocess.Popen([sys.executable, '-u', '-c', 'import sys, DB; DB.main(sys.argv[1], int(sys.argv[2]))', host, port],
+                          cwd=workdir, env=dict(env, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'server')])),
+                          stdout=open(os.path.join(workdir, 'db.log'), 'w'), stderr=subprocess.STDOUT)
+    wait_for(log, 'DB connection established')
+    return lobby, db, (host, int(port))
+
+def login(addr, name, user_type=0):
+    s = socket.create_connection(addr)
+    send_hello(s, 'hi')
+    send_json(s, {'collection': 'User', 'action': 'create_or_login',
+                  'data': {'username': name, 'password': 'pw', 'user_type': user_type}})
+    reply = recv_json(s)
+    assert reply and reply.get('ok'), reply
+    return s, reply['data']['user']
+
+def upload(dev, user_id, name):
+    send_json(dev, {'cmd': 'upload', 'name': name, 'desc': 'd', 'user_id': user_id, 'player_count': 2, 'ver': 1})
+    send_file(dev, GAME)
+    reply = recv_json(dev)
+    assert reply['status'] == 'ok', reply
+
+def test_play_count_updates_catalog():
+    with tempfile.TemporaryDirectory() as workdir:
+        lobby, db, addr = start_lobby(workdir)
+        try:
+            dev, user = login(addr, 'dev', 1)
+            for name in ('first', 'second'): upload(dev, user['user_code'], name)
+            a, _ = login(addr, 'alice')
+            b, _ = login(addr, 'bob')
+
+            before = call(a, {'cmd': 'list_catalog', 'sort': 'play_count'})
+            assert [g['play_count'] for g in before['games'].values()] == [0, 0]
+
+            room = call(a, {'cmd': 'create_room', 'game_name': 'second'})
+            assert call(b, {'cmd': 'join_room', 'room_id': room['room_id']})['status'] == 'ok'
+            for s in (a, b): assert recv_push(s)['status'] == 'game_start'
+
+            after = call(a, {'cmd': 'list_catalog', 'sort': 'play_count'})
+            assert list(after['games']) == ['second', 'first']
+            assert after['games']['second']['play_count'] == 2
+            assert after['version'] != before['version']
+        finally:
+            for proc in (db, lobby):
+                proc.kill()
+                proc.wait()
+
+if __name__ == "__main__":
+    test_play_count_updates_catalog()
+    print("ok")
@@ -2,6 +2,7 @@ import sys
 import socket
 import json
 import time
+from game_sdk import GameServer, StateMirror, serve
 
 def check_win(board):
     wins = [(0,1,2),(3,4,5),(6,7,8),(0,3,6),(1,4,7),(2,5,8),(0,4,8),(2,4,6)]
@@ -18,132 +19,50 @@ def print_board(board):
     print("---+---+---")
     print(f" {board[6]} | {board[7]} | {board[8]} \n")
 
-def run_server(port):
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    # 允許 Port 重用，避免重開時卡住
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind(('0.0.0.0', int(port)))
-    server.listen(2)
-    print(f"[GAME SERVER] Listening on {port}")
-    
-    players = []
-    player_files = []  
-     
-    # 等待兩個玩家連線
-    print("等待玩家 1 連線...")
-    conn1, addr1 = server.accept()
-    players.append(conn1)
-    player_files.append(conn1.makefile('r', encoding='utf-8'))
-    print(f"Player 1 connected: {addr1}")
+TURN_TIMEOUT = 60 # 每一步的秒數，逾時判負
 
-    print("等待玩家 2 連線...")
-    conn2, addr2 = server.accept()
-    players.append(conn2)
-    player_files.append(conn2.makefile('r', encoding='utf-8'))
-    print(f"Player 2 connected: {addr2}")
-    
-    board = [' '] * 9
-    turn = 0 
-    
-    try:
-        initial_state = {'board': board, 'turn': 'P1' if turn == 0 else 'P2'}
-        initial_msg = json.dumps(initial_state) + "\n"
-        for p in players:
-            try:
-                p.sendall(initial_msg.encode())
-            except:
-                pass
-        
-        while True:
-            current_player_idx = turn
-            current_file = player_files[current_player_idx]
-            print(f"等待 {'P1' if turn==0 else 'P2'} 輸入...")
-            
-            try:
-                line = current_file.readline()
-                #這裡去接受玩家的移動指令
-                if not line:
-                    print("玩家斷線")
-                    break
-                
-                move_str = line.strip()
-                print(f"收到輸入: {move_str}")
-                
-                if move_str.isdigit():
-                    move = int(move_str)
-                    if 0 <= move <= 8 and board[move] == ' ':
-                        board[move] = 'O' if turn == 0 else 'X'
-                        
-                        # 3. 移動後檢查勝負
-                        winner_symbol = check_win(board)
-                        if winner_symbol:
-                            # 將符號轉換為玩家名稱
-                            if winner_symbol == 'O':
-                                winner_name = 'P1'
-                            elif winner_symbol == 'X':
-                                winner_name = 'P2'
-                            else:  
-                                winner_name = 'Draw'
-                            
-                            # 廣播最後狀態和勝負結果
-                            final_state = {'board': board, 'turn': 'END', 'winner': winner_name}
-                            final_msg = json.dumps(final_state) + "\n"
-                            for p in players:
-                                try:
-                                    p.sendall(final_msg.encode())
-                                except:
-                                    pass
-                            print(f"遊戲結束: {winner_name} 獲勝")
-                            break
-                        
-                        turn = 1 - turn
-                        
-                        updated_state = {'board': board, 'turn': 'P1' if turn == 0 else 'P2'}
-                        updated_msg = json.dumps(updated_state) + "\n"
-                        for p in players:
-                            try:
-                                p.sendall(updated_msg.encode())
-                            except:
-                                pass
-                    else:
-                        print(f"無效移動: 位置 {move} 已被佔用或越界")
-                        invalid_state = {'board': board, 'turn': 'P1' if turn == 0 else 'P2'}
-                        invalid_msg = json.dumps(invalid_state) + "\n"
-                        for p in players:
-                            try:
-                                p.sendall(invalid_msg.encode())
-                            except:
-                                pass
-                else:
-                    print(f"收到非數字輸入: {move_str}")
-                    invalid_state = {'board': board, 'turn': 'P1' if turn == 0 else 'P2'}
-                    invalid_msg = json.dumps(invalid_state) + "\n"
-                    for p in players:
-                        try:
-                            p.sendall(invalid_msg.encode())
-                        except:
-                            pass
-            except ConnectionResetError:
-                print("連線被重置")
-                break
+class GameSession(GameServer):
+    """井字遊戲規則 (單獨執行或由大廳的 game host 執行都用這個類別)"""
+    player_count = 2
+    turn_timeout = TURN_TIMEOUT
 
-    except Exception as e:
-        print(f"Server Error: {e}")
-    finally:
-        if 'player_files' in locals():
-            for f in player_files:
-                try:
-                    f.close()
-                except:
-                    pass
-        if 'players' in locals():
-            for p in players:
-                try:
-                    p.close()
-                except:
-                    pass
-        server.close()
-        print("Server 關閉")
+    def __init__(self, session):
+        super().__init__(session)
+        self.turn = 0
+        self.state = {'board': [' '] * 9, 'turn': 'P1'}
+
+    def on_start(self):
+        self.send_snapshot()
+        self.start_turn()
+
+    def on_message(self, player, move_str):
+        if player.index != self.turn or len(self.players) < self.player_count:
+            return # 還沒輪到他
+        board = self.state['board']
+        if not (move_str.isdigit() and 0 <= int(move_str) <= 8 and board[int(move_str)] == ' '):
+            self.send_snapshot(player) # 無效移動只回傳目前狀態給他，讓他重新輸入 (不重新計時)
+            return
+        move = int(move_str)
+        delta = {f'board.{move}': 'O' if self.turn == 0 else 'X'}
+        board[move] = delta[f'board.{move}']
+        winner_symbol = check_win(board)
+        if winner_symbol:
+            self.finish({'O': 'P1', 'X': 'P2'}.get(winner_symbol, 'Draw'), delta)
+            return
+        self.turn = 1 - self.turn
+        delta['turn'] = 'P1' if self.turn == 0 else 'P2'
+        self.update(delta)
+        self.start_turn()
+
+    def on_timeout(self):
+        self.finish('P2' if self.turn == 0 else 'P1') # 逾時的一方判負
+
+    def finish(self, winner_name, delta=None):
+        self.update(dict(delta or {}, turn='END', winner=winner_name))
+        self.end()
+
+def run_server(port):
+    serve(GameSession, port)
 
 def run_client(ip, port, role):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -157,6 +76,7 @@ def run_client(ip, port, role):
     symbol = 'O' if role == 'P1' else 'X'
     
     sock_file = s.makefile('r', encoding='utf-8')
+    mirror = StateMirror(s) # Server 只送變更，這裡保存完整的棋盤
     
     try:
         while True:
@@ -171,6 +91,8 @@ def run_client(ip, port, role):
             except json.JSONDecodeError:
                 print("收到損毀的資料，略過")
                 continue
+            if not mirror.apply(data): continue
+            data = mirror.state
 
             if 'winner' in data:
                 print(f"\n=== 遊戲結束！贏家是: {data['winner']} ===")